@@ -0,0 +1,12 @@
+"""各阶段脚本共用的工具。"""
+
+from .cache import DirectoryCache, file_digest
+from .ffmpeg import get_ffmpeg_exe, parse_duration, parse_progress_time
+
+__all__ = [
+    'DirectoryCache',
+    'file_digest',
+    'get_ffmpeg_exe',
+    'parse_duration',
+    'parse_progress_time'
+]
@@ -0,0 +1,128 @@
+"""各脚本共用的磁盘缓存工具。
+
+- file_digest：按 (路径, mtime, 大小) 记忆的文件内容 sha256
+- DirectoryCache：目录缓存基类，负责命中统计、访问时间记录和按最近访问
+  时间（mtime）的 LRU 淘汰
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容的 sha256，按 (路径, mtime, 大小) 记忆，避免同一文件被反复读取"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _digest_lock:
+        digest = _file_digests.get(memo_key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+
+class DirectoryCache:
+    """目录缓存，默认一个条目一个文件
+
+    读取命中时调用 touch() 刷新 mtime，evict() 按 mtime 从旧到新删除条目，
+    直到条目数和总大小都不超过上限；设置了 max_age 时，超过 max_age 未被
+    访问的条目也会删除。写入中的临时文件（.tmp 结尾）不计入也不会被淘汰。
+    条目布局不同的子类（如一个条目一个目录）重写 _entries() 即可。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int,
+        max_entries: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        """初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+            max_entries: 最多保留的条目数，None 表示不限制
+            max_age: 条目有效期（秒），None 表示永不过期
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        """写入 path 前使用的临时文件，写完后 os.replace 到 path"""
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    @staticmethod
+    def touch(path: str):
+        os.utime(path)  # 记录访问时间，供淘汰使用
+
+    def record(self, hit: bool):
+        """记录一次命中或未命中"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """列出所有条目的 (最近访问时间, 大小, 路径)"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """删除过期条目，并把条目数和总大小压到上限以内"""
+        with self._lock:
+            entries = []
+            now = time.time()
+            for mtime, size, path in self._entries():
+                if self.max_age is not None and now - mtime > self.max_age:
+                    self._remove(path)
+                    continue
+                entries.append((mtime, size, path))
+
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            max_entries = len(entries) if self.max_entries is None else self.max_entries
+            while entries and (len(entries) > max_entries or total > self.max_bytes):
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass  # 可能已被其他进程淘汰
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
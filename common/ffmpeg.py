@@ -0,0 +1,40 @@
+"""ffmpeg 可执行文件的查找和输出解析，视频合成与发布前转码共用。"""
+import re
+import shutil
+from typing import Optional
+
+# ffmpeg 输出中的时间戳 HH:MM:SS.xx
+_TIMESTAMP = r"(\d+):(\d+):(\d+(?:\.\d+)?)"
+
+
+def get_ffmpeg_exe() -> str:
+    """返回 ffmpeg 可执行文件路径，优先使用 moviepy 自带的 imageio-ffmpeg，其次是 PATH 中的 ffmpeg"""
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe as _get_ffmpeg_exe
+        return _get_ffmpeg_exe()
+    except (ImportError, RuntimeError) as e:
+        path = shutil.which("ffmpeg")
+        if not path:
+            raise FileNotFoundError("找不到 ffmpeg，请安装 ffmpeg 或 imageio-ffmpeg") from e
+        return path
+
+
+def _seconds(hours: str, minutes: str, seconds: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_duration(output: str) -> Optional[float]:
+    """
+    从 ffmpeg -i 的输出中读取容器时长（秒），没有时返回 None
+
+    没有时长信息的格式（如 ADTS 封装的 AAC）这里只是按码率估算的值，需要准确
+    时长时用 parse_progress_time 读取完整解码后的进度。
+    """
+    match = re.search(rf"Duration: {_TIMESTAMP}", output)
+    return _seconds(*match.groups()) if match else None
+
+
+def parse_progress_time(output: str) -> Optional[float]:
+    """从 ffmpeg 处理过程的输出中读取最后一个 time= 进度（秒），没有时返回 None"""
+    times = re.findall(rf"time={_TIMESTAMP}", output)
+    return _seconds(*times[-1]) if times else None
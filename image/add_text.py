@@ -1,196 +1,572 @@
 from PIL import Image, ImageDraw, ImageFont
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+import argparse
+import glob
+import io
 import os
 import json
+import threading
+import time
+import traceback
 
-def calculate_font_size(text, font_path, target_width, initial_size=60):
+from common.cache import DirectoryCache, file_digest
+
+from .fonts import get_registry
+
+# 默认编码质量，与 Pillow 的默认值一致；配合 optimize + progressive 比直接保存更小
+DEFAULT_QUALITY = 75
+
+# 底图缓存：同一张原图换标题时只需重新绘制文字。进程内保留最近用过的几张，
+# 磁盘上的缓存供进程池中的其他进程和之后的命令行运行复用
+BASE_LAYER_CACHE_SIZE = 32
+BASE_LAYER_CACHE_DIR = "output/cache/covers"
+_base_layers = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class BaseLayerCache(DirectoryCache):
+    """封面底图的磁盘缓存
+    
+    每张底图以无损 PNG 保存为 <cache_dir>/<原图 sha256>_<宽>x<高>_<背景色>.png，
+    总大小超限时按最近访问时间淘汰最旧的条目（见 DirectoryCache）。
+    """
+
+    def __init__(self, cache_dir: str = BASE_LAYER_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+
+    def _path(self, key):
+        digest, (width, height), background = key
+        color = "".join(f"{c:02x}" for c in background)
+        return os.path.join(self.cache_dir, f"{digest}_{width}x{height}_{color}.png")
+
+    def get(self, key):
+        """读取底图，不存在或已损坏时返回 None"""
+        path = self._path(key)
+        try:
+            with Image.open(path) as img:
+                base = img.convert("RGB")
+        except OSError:
+            self.record(False)
+            return None
+        self.record(True)
+        self.touch(path)
+        return base
+
+    def put(self, key, base):
+        """原子写入底图，然后淘汰超出上限的条目"""
+        path = self._path(key)
+        tmp_path = self._tmp_path(path)
+        # 压缩级别 1：体积略大，但编码和解码都远快于默认级别
+        base.save(tmp_path, format="PNG", compress_level=1)
+        os.replace(tmp_path, path)
+        self.evict()
+
+
+_disk_cache = None
+
+
+def get_base_layer_cache():
+    """进程内共享的底图磁盘缓存"""
+    global _disk_cache
+    with _cache_lock:
+        if _disk_cache is None:
+            _disk_cache = BaseLayerCache()
+        return _disk_cache
+
+
+@lru_cache(maxsize=256)
+def load_font(font_path, size, font_index=0):
+    """加载字体，同一 (字体文件, 字号, 字体序号) 只从磁盘读取一次"""
+    return ImageFont.truetype(font_path, size, index=font_index)
+
+
+@lru_cache(maxsize=4096)
+def measure_text(font_path, size, text, font_index=0):
+    """测量文字的包围盒 (left, top, right, bottom)，结果按 (字体文件, 字号, 文字, 字体序号) 缓存"""
+    return load_font(font_path, size, font_index).getbbox(text)
+
+
+def calculate_font_size(text, font_path, target_width, min_size=20, max_size=200, font_index=0):
     """
     计算合适的字体大小
     
+    在 [min_size, max_size] 内二分查找文字宽度不超过 target_width 的最大字号，
+    即使最小字号也放不下时返回 min_size。
+    
     Args:
         text (str): 要绘制的文字
         font_path (str): 字体文件路径
         target_width (int): 目标宽度
-        initial_size (int): 初始字体大小
+        min_size (int): 最小字体大小
+        max_size (int): 最大字体大小
+        font_index (int): .ttc/.otc 字体集合中的字体序号
     
     Returns:
         tuple: (font, actual_width, actual_height) 字体对象、实际宽度和高度
     """
-    font_size_test = initial_size
-    font = ImageFont.truetype(font_path, font_size_test)
-    bbox = font.getbbox(text)
+    def width_at(size):
+        bbox = measure_text(font_path, size, text, font_index)
+        return bbox[2] - bbox[0]
+
+    low, high = min_size, max_size
+    best = min_size
+    while low <= high:
+        mid = (low + high) // 2
+        if width_at(mid) <= target_width:
+            best = mid
+            low = mid + 1
+        else:
+            high = mid - 1
+    
+    bbox = measure_text(font_path, best, text, font_index)
     text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
     
-    # 动态调整字体大小
-    while text_width < target_width and font_size_test < 200:
-        font_size_test += 5
-        font = ImageFont.truetype(font_path, font_size_test)
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
+    return load_font(font_path, best, font_index), text_width, text_height
+
+def letterbox(img, target_size, background=(255, 255, 255), upscale=False):
+    """
+    把图片等比缩放后居中贴到 target_size 的纯色背景上
     
-    while text_width > target_width and font_size_test > 20:
-        font_size_test -= 5
-        font = ImageFont.truetype(font_path, font_size_test)
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
+    Args:
+        img (Image.Image): 已打开的原图，不会被修改
+        target_size (tuple): 输出尺寸
+        background (tuple): 背景颜色
+        upscale (bool): 原图小于目标尺寸时是否放大，默认只缩小
     
-    bbox = font.getbbox(text)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
+    Returns:
+        Image.Image: 新的底图
+    """
+    scale = min(target_size[0] / img.width, target_size[1] / img.height)
+    if scale < 1 or upscale:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        resized = img.resize(size, Image.Resampling.LANCZOS)
+    else:
+        resized = img
     
-    return font, text_width, text_height
+    base = Image.new('RGB', target_size, background)
+    paste_x = (target_size[0] - resized.width) // 2
+    paste_y = (target_size[1] - resized.height) // 2
+    base.paste(resized, (paste_x, paste_y))
+    return base
 
-def add_artistic_text(image_path, text1, text2, output_path=None, 
-                     font_path="fonts/SimHei.ttf", 
-                     text_color=(255, 255, 255)):
+def load_base_layer(image_path, target_size=(600, 800), background=(255, 255, 255)):
     """
-    给图片添加两行艺术文字
+    生成封面底图：原图等比缩放后居中贴在纯色背景上
+    
+    JPEG 原图远大于目标尺寸时使用 draft 模式按 1/2、1/4、1/8 直接解码，
+    省去完整解码的开销。结果按 (原图内容哈希, 尺寸, 背景色) 缓存在进程内和
+    output/cache/covers 下，返回副本。
     
     Args:
-        image_path (str): 输入图片路径
-        text1 (str): 第一行文字
-        text2 (str): 第二行文字
+        image_path (str): 原图路径
+        target_size (tuple): 底图尺寸
+        background (tuple): 背景颜色
+    
+    Returns:
+        Image.Image: 底图
+    """
+    key = (file_digest(image_path), tuple(target_size), tuple(background))
+    with _cache_lock:
+        cached = _base_layers.get(key)
+        if cached is not None:
+            _base_layers.move_to_end(key)
+            return cached.copy()
+    
+    disk_cache = get_base_layer_cache()
+    base = disk_cache.get(key)
+    if base is None:
+        img = Image.open(image_path)
+        if img.format == "JPEG":
+            # draft 保证解码结果在两个方向上都不小于目标尺寸，缩放质量不受影响
+            img.draft("RGB", target_size)
+        base = letterbox(img, target_size, background)
+        disk_cache.put(key, base)
+    
+    with _cache_lock:
+        _base_layers[key] = base
+        while len(_base_layers) > BASE_LAYER_CACHE_SIZE:
+            _base_layers.popitem(last=False)
+    return base.copy()
+
+def encode_image(img, fmt="JPEG", quality=DEFAULT_QUALITY):
+    """把图片编码为字节串，JPEG 使用 optimize + progressive，WebP 使用较慢但更小的压缩档位"""
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        img.save(buffer, "WEBP", quality=quality, method=6)
+    else:
+        img.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def save_image(img, output_path, quality=DEFAULT_QUALITY, max_bytes=None, min_quality=40):
+    """
+    编码并保存图片，可指定文件大小上限
+    
+    格式由扩展名决定：.webp 保存为 WebP，其余保存为 JPEG。指定 max_bytes 时
+    在 [min_quality, quality] 内二分查找不超过上限的最高质量；最低质量仍然
+    超限时按最低质量保存并打印警告，调用方可以比较返回的大小和 max_bytes。
+    
+    Args:
+        img (Image.Image): 要保存的图片
         output_path (str): 输出路径
-        font_path (str): 字体文件路径
-        text_color (tuple): 文字颜色
+        quality (int): 质量（有上限时为最高质量）
+        max_bytes (int): 文件大小上限（字节），None 表示不限制
+        min_quality (int): 允许的最低质量
+    
+    Returns:
+        tuple: (quality, size) 实际使用的质量和文件大小
     """
-    # 打开图片
-    img = Image.open(image_path)
+    fmt = "WEBP" if output_path.lower().endswith(".webp") else "JPEG"
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
     
-    # 调整图片大小为 600x800，保持宽高比
-    target_size = (600, 800)
-    img.thumbnail(target_size, Image.Resampling.LANCZOS)
+    best_quality, data = quality, encode_image(img, fmt, quality)
+    if max_bytes is not None and len(data) > max_bytes:
+        best_quality, data = min_quality, encode_image(img, fmt, min_quality)
+        low, high = min_quality + 1, quality - 1
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = encode_image(img, fmt, mid)
+            if len(candidate) <= max_bytes:
+                best_quality, data = mid, candidate
+                low = mid + 1
+            else:
+                high = mid - 1
+        if len(data) > max_bytes:
+            print(f"警告: {output_path} 以最低质量 {min_quality} 保存仍有 {len(data) / 1024:.1f} KB，"
+                  f"超出上限 {max_bytes / 1024:.1f} KB")
     
-    # 创建新的白色背景图片
-    new_img = Image.new('RGB', target_size, (255, 255, 255))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+    return best_quality, len(data)
+
+def draw_outlined_text(draw, xy, text, font, text_color=(255, 255, 255),
+                       outline_color=(0, 0, 0), outline_width=3):
+    """
+    绘制带描边的文字
     
-    # 将调整后的图片粘贴到中心位置
-    paste_x = (target_size[0] - img.width) // 2
-    paste_y = (target_size[1] - img.height) // 2
-    new_img.paste(img, (paste_x, paste_y))
+    描边由 FreeType 在同一次栅格化中生成，耗时与描边宽度无关，
+    取代逐个偏移量重复绘制 (2w+1)^2-1 次的做法。
     
-    # 使用新的图片继续处理
-    img = new_img
+    Args:
+        draw (ImageDraw.ImageDraw): 绘制对象
+        xy (tuple): 文字左上角坐标
+        text (str): 要绘制的文字
+        font (FreeTypeFont): 字体
+        text_color (tuple): 文字颜色
+        outline_color (tuple): 描边颜色
+        outline_width (int): 描边宽度，0 表示不描边
+    """
+    draw.text(
+        xy,
+        text,
+        font=font,
+        fill=text_color,
+        stroke_width=outline_width,
+        stroke_fill=outline_color
+    )
+
+@lru_cache(maxsize=64)
+def resolve_font_path(font_path=None):
+    """
+    返回用于绘制的字体 (文件路径, 字体序号)
     
-    # 创建可绘制对象
-    draw = ImageDraw.Draw(img)
+    font_path 是存在的文件时直接使用其中第一个字体；否则把它当作字体名称，连同
+    默认的中文字体回退链（冬青黑体、苹方、Noto Sans CJK、文泉驿……）在系统字体
+    索引中查找。.ttc/.otc 字体集合中同一文件包含多个字体（如 Noto Sans CJK 的
+    SC/JP 等地区变体），需要连同序号一起传给 ImageFont.truetype。
+    """
+    if font_path and os.path.exists(font_path):
+        return font_path, 0
     
-    # 加载字体
-    try:
-        # macOS 系统常见粗体字体路径
-        font_path = "/System/Library/Fonts/Hiragino Sans GB.ttc"  # 冬青黑体
-        if not os.path.exists(font_path):
-            raise FileNotFoundError("未找到字体文件")
-            
-        print(f"使用字体: {font_path}")
-    except Exception as e:
-        print(f"警告: 加载字体失败 ({str(e)})，使用默认字体")
-        font = ImageFont.load_default()
-    
-    # 文字样式设置（移到函数开头）
-    text_color = (255, 255, 255)  # 白色
-    outline_color = (0, 0, 0)     # 黑色
-    outline_width = 3             # 描边宽度
+    registry = get_registry()
+    names = [font_path] if font_path else []
+    entry = registry.resolve(names, require_cjk=True)
+    if entry is None:
+        entry = registry.resolve(names, require_cjk=False)
+        if entry is None:
+            raise FileNotFoundError("未找到任何可用字体，请安装中文字体（如 Noto Sans CJK）或通过 font_path 指定")
+        print(f"警告: 系统中没有支持中文的字体，使用 {entry.path}，中文可能无法正常显示")
+    print(f"使用字体: {entry.family} ({entry.path}#{entry.index})")
+    return entry.path, entry.index
+
+def split_title(text1):
+    """标题超过10个字时尽量在中间的标点处拆成两行"""
+    # 尽量在中间位置分行
+    mid_point = len(text1) // 2
+    # 从中间向两边寻找适合的分割点（标点符号或空格）
+    split_point = mid_point
+    for i in range(min(5, mid_point)):  # 在中间位置前后5个字符内寻找
+        if text1[mid_point-i] in '，。！？、 ,!?.':
+            split_point = mid_point-i+1
+            break
+        if text1[mid_point+i] in '，。！？、 ,!?.':
+            split_point = mid_point+i+1
+            break
+    return text1[:split_point], text1[split_point:]
+
+@lru_cache(maxsize=1024)
+def layout_text(text1, text2, width, height, font_path, font_index=0):
+    """
+    计算标题和副标题的字号与位置
+    
+    结果只取决于文字、画布尺寸和字体，按这些参数缓存，
+    同一尺寸的多个输出可以共用一次排版。
+    
+    Returns:
+        tuple: ((文字, 字号, x, y), ...)
+    """
+    items = []
     
     # 处理 text1，如果超过10个字则分两行
     if len(text1) > 10:
-        # 尽量在中间位置分行
-        mid_point = len(text1) // 2
-        # 从中间向两边寻找适合的分割点（标点符号或空格）
-        split_point = mid_point
-        for i in range(min(5, mid_point)):  # 在中间位置前后5个字符内寻找
-            if text1[mid_point-i] in '，。！？、 ,!?.':
-                split_point = mid_point-i+1
-                break
-            if text1[mid_point+i] in '，。！？、 ,!?.':
-                split_point = mid_point+i+1
-                break
-        
-        text1_line1 = text1[:split_point]
-        text1_line2 = text1[split_point:]
+        text1_line1, text1_line2 = split_title(text1)
         
         # 计算第一行文字的字体大小和位置
-        target_width1 = int(img.width * 0.8)
-        font1, text_width1, text_height1 = calculate_font_size(text1_line1, font_path, target_width1)
-        x1 = (img.width - text_width1) // 2
+        target_width1 = int(width * 0.8)
+        font1, text_width1, text_height1 = calculate_font_size(text1_line1, font_path, target_width1, font_index=font_index)
+        x1 = (width - text_width1) // 2
         y1 = 50  # 距离顶部50像素
         
         # 计算第二行文字的字体大小和位置（使用相同的字体大小）
-        bbox = font1.getbbox(text1_line2)
+        bbox = measure_text(font_path, font1.size, text1_line2, font_index)
         text_width1_2 = bbox[2] - bbox[0]
-        text_height1_2 = bbox[3] - bbox[1]
-        x1_2 = (img.width - text_width1_2) // 2
+        x1_2 = (width - text_width1_2) // 2
         y1_2 = y1 + text_height1 + 10  # 第一行文字下方10像素
         
-        # 绘制text1第一行
-        for offset_x in range(-outline_width, outline_width + 1):
-            for offset_y in range(-outline_width, outline_width + 1):
-                if offset_x == 0 and offset_y == 0:
-                    continue
-                draw.text(
-                    (x1 + offset_x, y1 + offset_y),
-                    text1_line1,
-                    font=font1,
-                    fill=outline_color
-                )
-        draw.text((x1, y1), text1_line1, font=font1, fill=text_color)
-        
-        # 绘制text1第二行
-        for offset_x in range(-outline_width, outline_width + 1):
-            for offset_y in range(-outline_width, outline_width + 1):
-                if offset_x == 0 and offset_y == 0:
-                    continue
-                draw.text(
-                    (x1_2 + offset_x, y1_2 + offset_y),
-                    text1_line2,
-                    font=font1,
-                    fill=outline_color
-                )
-        draw.text((x1_2, y1_2), text1_line2, font=font1, fill=text_color)
-        
+        items.append((text1_line1, font1.size, x1, y1))
+        items.append((text1_line2, font1.size, x1_2, y1_2))
     else:
         # 原来的单行text1处理逻辑
-        target_width1 = int(img.width * 0.9)
-        font1, text_width1, text_height1 = calculate_font_size(text1, font_path, target_width1)
-        x1 = (img.width - text_width1) // 2
+        target_width1 = int(width * 0.9)
+        font1, text_width1, text_height1 = calculate_font_size(text1, font_path, target_width1, font_index=font_index)
+        x1 = (width - text_width1) // 2
         y1 = 50  # 距离顶部50像素
-        
-        # 绘制单行text1
-        for offset_x in range(-outline_width, outline_width + 1):
-            for offset_y in range(-outline_width, outline_width + 1):
-                if offset_x == 0 and offset_y == 0:
-                    continue
-                draw.text(
-                    (x1 + offset_x, y1 + offset_y),
-                    text1,
-                    font=font1,
-                    fill=outline_color
-                )
-        draw.text((x1, y1), text1, font=font1, fill=text_color)
+        items.append((text1, font1.size, x1, y1))
     
     # 计算第二行文字的字体大小和位置（text2）
-    target_width2 = int(img.width * 0.8)
-    font2, text_width2, text_height2 = calculate_font_size(text2, font_path, target_width2)
-    x2 = (img.width - text_width2) // 2
-    y2 = img.height - text_height2 - 50  # 距离底部50像素
-    
-    # 绘制第二行文字
-    for offset_x in range(-outline_width, outline_width + 1):
-        for offset_y in range(-outline_width, outline_width + 1):
-            if offset_x == 0 and offset_y == 0:
-                continue
-            draw.text(
-                (x2 + offset_x, y2 + offset_y),
-                text2,
-                font=font2,
-                fill=outline_color
-            )
-    draw.text((x2, y2), text2, font=font2, fill=text_color)
+    target_width2 = int(width * 0.8)
+    font2, text_width2, text_height2 = calculate_font_size(text2, font_path, target_width2, font_index=font_index)
+    x2 = (width - text_width2) // 2
+    y2 = height - text_height2 - 50  # 距离底部50像素
+    items.append((text2, font2.size, x2, y2))
+    
+    return tuple(items)
+
+def draw_text_layout(img, layout, font_path, text_color=(255, 255, 255),
+                     outline_color=(0, 0, 0), outline_width=3, font_index=0):
+    """按 layout_text 的结果在图片上绘制描边文字"""
+    draw = ImageDraw.Draw(img)
+    for text, size, x, y in layout:
+        draw_outlined_text(draw, (x, y), text, load_font(font_path, size, font_index),
+                           text_color, outline_color, outline_width)
+
+def add_artistic_text(image_path, text1, text2, output_path=None, 
+                     font_path="fonts/SimHei.ttf", 
+                     text_color=(255, 255, 255),
+                     outline_color=(0, 0, 0),
+                     outline_width=3,
+                     quality=DEFAULT_QUALITY,
+                     max_bytes=None):
+    """
+    给图片添加两行艺术文字
+    
+    Args:
+        image_path (str): 输入图片路径
+        text1 (str): 第一行文字
+        text2 (str): 第二行文字
+        output_path (str): 输出路径，默认 output/image.jpg，.webp 结尾时保存为 WebP
+        font_path (str): 字体文件路径
+        text_color (tuple): 文字颜色
+        outline_color (tuple): 描边颜色
+        outline_width (int): 描边宽度
+        quality (int): 编码质量，默认 75
+        max_bytes (int): 封面文件大小上限（字节），None 表示不限制
+    """
+    # 将图片等比缩放为 600x800 并居中贴到白色背景上（带缓存）
+    img = load_base_layer(image_path, (600, 800))
+    
+    font_path, font_index = resolve_font_path(font_path)
+    layout = layout_text(text1, text2, img.width, img.height, font_path, font_index)
+    draw_text_layout(img, layout, font_path, text_color, outline_color, outline_width, font_index)
     
     # 保存图片
-    os.makedirs("output", exist_ok=True)
-    img.save("output/image.jpg")
+    output_path = output_path or "output/image.jpg"
+    used_quality, size = save_image(img, output_path, quality=quality, max_bytes=max_bytes)
+    if max_bytes is not None and size > max_bytes:
+        print(f"封面超出大小上限: {output_path} (质量 {used_quality}, {size / 1024:.0f} KB)")
+    else:
+        print(f"封面已保存: {output_path} (质量 {used_quality}, {size / 1024:.0f} KB)")
+
+@dataclass
+class CoverVariant:
+    """多尺寸封面中的一个输出"""
+    size: tuple
+    output_path: str
+    max_bytes: Optional[int] = None
+    upscale: bool = False
+
+def default_variants(output_dir):
+    """每个角色每天需要的规格：小红书封面、方形缩略图、竖屏视频帧"""
+    return [
+        CoverVariant((600, 800), os.path.join(output_dir, "image.jpg")),
+        CoverVariant((400, 400), os.path.join(output_dir, "thumb.jpg")),
+        CoverVariant((1080, 1920), os.path.join(output_dir, "frame.jpg"), upscale=True),
+    ]
+
+def render_cover_variants(image_path, text1, text2, variants,
+                          font_path=None,
+                          text_color=(255, 255, 255),
+                          outline_color=(0, 0, 0),
+                          outline_width=3,
+                          quality=DEFAULT_QUALITY):
+    """
+    原图只解码一次，生成多个尺寸的封面
+    
+    JPEG 按最大的输出尺寸以 draft 模式解码；相同尺寸的输出共用同一次排版和绘制，
+    只分别编码。
+    
+    Args:
+        image_path (str): 输入图片路径
+        text1 (str): 第一行文字
+        text2 (str): 第二行文字
+        variants (List[CoverVariant]): 输出规格列表
+        font_path (str): 字体文件路径
+        text_color (tuple): 文字颜色
+        outline_color (tuple): 描边颜色
+        outline_width (int): 描边宽度
+        quality (int): 编码质量，默认 75
+    
+    Returns:
+        List[str]: 与 variants 顺序一致的输出路径
+    """
+    source = Image.open(image_path)
+    if source.format == "JPEG":
+        largest = (max(v.size[0] for v in variants), max(v.size[1] for v in variants))
+        source.draft("RGB", largest)
+    source.load()
+    
+    font_path, font_index = resolve_font_path(font_path)
+    rendered = {}
+    for variant in variants:
+        key = (tuple(variant.size), variant.upscale)
+        if key not in rendered:
+            img = letterbox(source, variant.size, upscale=variant.upscale)
+            layout = layout_text(text1, text2, img.width, img.height, font_path, font_index)
+            draw_text_layout(img, layout, font_path, text_color, outline_color, outline_width, font_index)
+            rendered[key] = img
+        save_image(rendered[key], variant.output_path, quality=quality, max_bytes=variant.max_bytes)
+    
+    return [variant.output_path for variant in variants]
+
+@dataclass
+class CoverJob:
+    """批量渲染中的一个封面任务"""
+    source_image: str
+    title: str
+    subtitle: str
+    output_path: str
+
+@dataclass
+class CoverResult:
+    job: CoverJob
+    duration: float
+    error: Optional[str] = None
+
+def _render_job(job, max_bytes=None):
+    """在子进程中渲染单个封面，异常转为错误信息返回"""
+    start = time.perf_counter()
+    try:
+        add_artistic_text(
+            job.source_image, job.title, job.subtitle,
+            output_path=job.output_path, max_bytes=max_bytes
+        )
+        size = os.path.getsize(job.output_path)
+        if max_bytes is not None and size > max_bytes:
+            return CoverResult(job, time.perf_counter() - start,
+                               f"封面 {size / 1024:.1f} KB 超出上限 {max_bytes / 1024:.1f} KB")
+        return CoverResult(job, time.perf_counter() - start)
+    except Exception:
+        return CoverResult(job, time.perf_counter() - start, traceback.format_exc())
+
+def render_covers(jobs, max_workers=None, max_bytes=None):
+    """
+    使用进程池批量渲染封面
+    
+    Args:
+        jobs (List[CoverJob]): 封面任务列表
+        max_workers (int): 进程数，默认为 CPU 核数
+        max_bytes (int): 每张封面的文件大小上限（字节）
+    
+    Returns:
+        List[CoverResult]: 与 jobs 顺序一致的结果，包含每个任务的耗时和错误信息
+    """
+    if not jobs:
+        return []
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    results: List[Optional[CoverResult]] = [None] * len(jobs)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_render_job, job, max_bytes): index for index, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[futures[future]] = result
+            status = "失败" if result.error else "完成"
+            print(f"[{done}/{len(jobs)}] {status} {result.job.output_path} ({result.duration:.2f}s)")
+    
+    return results
+
+def _load_jobs(args):
+    """根据命令行参数构建批量任务"""
+    if args.jobs:
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            return [CoverJob(**item) for item in json.load(f)]
+    
+    jobs = []
+    for image_path in sorted(glob.glob(os.path.join(args.images, "*.jpg"))):
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        jobs.append(CoverJob(
+            image_path, args.title, args.subtitle,
+            os.path.join(args.output_dir, f"{name}.jpg")
+        ))
+    return jobs
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='给封面图片添加文字')
+    parser.add_argument('--jobs', type=str, default=None,
+                        help='批量任务 JSON 文件，内容为 [{source_image, title, subtitle, output_path}, ...]')
+    parser.add_argument('--images', type=str, default=None,
+                        help='批量处理目录下所有 .jpg，配合 --title/--subtitle 使用')
+    parser.add_argument('--title', type=str, default="")
+    parser.add_argument('--subtitle', type=str, default="")
+    parser.add_argument('--output-dir', type=str, default="output/covers")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='进程数，默认为 CPU 核数')
+    parser.add_argument('--max-kb', type=int, default=None,
+                        help='封面文件大小上限（KB），超出时自动降低质量')
+    args = parser.parse_args()
+    max_bytes = args.max_kb * 1024 if args.max_kb else None
+    
+    if args.jobs or args.images:
+        jobs = _load_jobs(args)
+        start = time.perf_counter()
+        results = render_covers(jobs, args.workers, max_bytes)
+        elapsed = time.perf_counter() - start
+        
+        failed = [r for r in results if r.error]
+        for result in failed:
+            print(f"渲染失败: {result.job.source_image}\n{result.error}")
+        busy = sum(r.duration for r in results)
+        print(f"共 {len(results)} 张，失败 {len(failed)} 张，累计渲染 {busy:.1f}s，实际耗时 {elapsed:.1f}s")
+        raise SystemExit(1 if failed else 0)
+    
     # 读取配置文件
     with open('output/script.json', 'r', encoding='utf-8') as f:
         config = json.load(f)
@@ -202,6 +578,6 @@ if __name__ == "__main__":
     text2 = f"让全世界都听见 {config['name']}"
     
     # 处理图片
-    add_artistic_text(cover_image, text1, text2)
+    add_artistic_text(cover_image, text1, text2, max_bytes=max_bytes)
     print("处理完成，图片已保存到 output/image.jpg")
     
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""系统字体索引
+
+扫描一次系统字体目录，记录每个字体的 family、style、是否粗体以及是否覆盖中文，
+并持久化到磁盘。之后按名称或回退链查找字体时直接查索引，字体目录没有变化时
+不会重新扫描。
+"""
+import argparse
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence
+
+from PIL import ImageFont
+
+INDEX_PATH = "output/cache/font_index.json"
+INDEX_VERSION = 1
+
+FONT_DIRS = [
+    "/System/Library/Fonts",
+    "/Library/Fonts",
+    "~/Library/Fonts",
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "~/.fonts",
+    "~/.local/share/fonts",
+    "C:/Windows/Fonts",
+]
+FONT_EXTENSIONS = (".ttf", ".ttc", ".otf", ".otc")
+
+# 封面默认使用的中文字体回退链，macOS 上与原来的冬青黑体保持一致
+CJK_FALLBACKS = [
+    "Hiragino Sans GB",
+    "PingFang SC",
+    "Noto Sans CJK SC",
+    "Noto Sans SC",
+    "Source Han Sans SC",
+    "WenQuanYi Zen Hei",
+    "WenQuanYi Micro Hei",
+    "SimHei",
+    "Microsoft YaHei",
+    "Droid Sans Fallback",
+]
+
+# 用于检测中文覆盖的字符
+CJK_PROBE = "原神让全世界都听见"
+
+
+@dataclass
+class FontEntry:
+    path: str
+    index: int
+    family: str
+    style: str
+    bold: bool
+    cjk: bool
+
+
+def _covers(font, text):
+    """字体是否包含 text 中的所有字符：缺字会被渲染成与 .notdef 相同的方框"""
+    notdef = font.getmask("\U000FFFFD")
+    notdef_key = (notdef.size, bytes(notdef))
+    for ch in text:
+        mask = font.getmask(ch)
+        if mask.getbbox() is None or (mask.size, bytes(mask)) == notdef_key:
+            return False
+    return True
+
+
+def _inspect(path):
+    """读取字体文件（含 .ttc 集合中的每个字体）的信息"""
+    entries = []
+    index = 0
+    while True:
+        try:
+            font = ImageFont.truetype(path, 24, index=index)
+        except OSError:
+            break
+        family, style = font.getname()
+        entries.append(FontEntry(
+            path=path,
+            index=index,
+            family=family or "",
+            style=style or "",
+            bold=any(w in (style or "").lower() for w in ("bold", "heavy", "black", "w6", "semibold")),
+            cjk=_covers(font, CJK_PROBE),
+        ))
+        if not path.lower().endswith((".ttc", ".otc")):
+            break
+        index += 1
+    return entries
+
+
+class FontRegistry:
+    def __init__(self, index_path: str = INDEX_PATH, font_dirs: Optional[Sequence[str]] = None):
+        """初始化字体索引
+
+        Args:
+            index_path: 索引文件路径
+            font_dirs: 要扫描的字体目录，默认为各系统的常见目录
+        """
+        self.index_path = index_path
+        self.font_dirs = [os.path.expanduser(d) for d in (font_dirs or FONT_DIRS)]
+        self.fonts: List[FontEntry] = []
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        """字体目录及其子目录的修改时间，安装或删除字体后会变化"""
+        signature = {}
+        for font_dir in self.font_dirs:
+            if not os.path.isdir(font_dir):
+                continue
+            for root, _dirs, _ in os.walk(font_dir):
+                signature[root] = os.stat(root).st_mtime_ns
+        return signature
+
+    def load(self, rescan: bool = False):
+        """加载索引，目录有变化或 rescan 为 True 时重新扫描"""
+        with self._lock:
+            if self._loaded and not rescan:
+                return
+            signature = self._signature()
+            if not rescan and os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    if data.get("version") == INDEX_VERSION and data.get("signature") == signature:
+                        self.fonts = [FontEntry(**item) for item in data["fonts"]]
+                        self._loaded = True
+                        return
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass
+
+            self.fonts = self._scan()
+            self._save(signature)
+            self._loaded = True
+
+    def _scan(self):
+        print("正在扫描系统字体目录...")
+        fonts = []
+        for font_dir in self.font_dirs:
+            if not os.path.isdir(font_dir):
+                continue
+            for root, _, files in os.walk(font_dir):
+                for name in sorted(files):
+                    if name.lower().endswith(FONT_EXTENSIONS):
+                        fonts.extend(_inspect(os.path.join(root, name)))
+        print(f"共找到 {len(fonts)} 个字体，其中 {sum(f.cjk for f in fonts)} 个支持中文")
+        return fonts
+
+    def _save(self, signature):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "signature": signature,
+                "fonts": [asdict(font) for font in self.fonts],
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def find(self, name: str, require_cjk: bool = False) -> Optional[FontEntry]:
+        """按 family 名称（不区分大小写）查找字体，同名时取集合中靠前的字体，其次是常规体"""
+        self.load()
+        name = name.lower()
+        matches = [
+            font for font in self.fonts
+            if font.family.lower() == name and (font.cjk or not require_cjk)
+        ]
+        if not matches:
+            return None
+        return min(matches, key=lambda font: (font.index, font.bold, font.path))
+
+    def resolve(self, names: Sequence[str] = (), require_cjk: bool = True) -> Optional[FontEntry]:
+        """依次尝试 names 和默认回退链，都找不到时返回任意一个满足条件的字体"""
+        for name in list(names) + CJK_FALLBACKS:
+            font = self.find(name, require_cjk)
+            if font:
+                return font
+        candidates = [font for font in self.fonts if font.cjk or not require_cjk]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda font: (font.path, font.index))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> FontRegistry:
+    """进程内共享的字体索引"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FontRegistry()
+        return _registry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查看系统字体索引')
+    parser.add_argument('--rescan', action='store_true', help='强制重新扫描字体目录')
+    parser.add_argument('--cjk', action='store_true', help='只列出支持中文的字体')
+    args = parser.parse_args()
+
+    registry = get_registry()
+    registry.load(rescan=args.rescan)
+    for font in registry.fonts:
+        if args.cjk and not font.cjk:
+            continue
+        print(f"{font.family} / {font.style}  {'中文 ' if font.cjk else ''}{font.path}#{font.index}")
+
+    chosen = registry.resolve()
+    print(f"封面默认字体: {chosen.path if chosen else '无'}")
@@ -0,0 +1,21 @@
+"""多角色内容生产流水线。"""
+
+from .cache import StageCache
+from .runner import (
+    Character,
+    PipelineRunner,
+    Stage,
+    StageResult,
+    build_stages,
+    load_characters,
+)
+
+__all__ = [
+    'Character',
+    'PipelineRunner',
+    'Stage',
+    'StageCache',
+    'StageResult',
+    'build_stages',
+    'load_characters'
+]
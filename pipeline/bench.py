@@ -0,0 +1,226 @@
+"""用本地模拟服务压测流水线。
+
+在后台线程中启动 pipeline.fake_servers，把 GPT 和 TTS 的地址指向它，然后用
+PipelineRunner 跑完整的 文案 → 封面 / 语音 → 视频 链路（不发布），最后按阶段
+统计吞吐量和耗时分位数（p50/p95/p99）。默认不使用任何缓存，每次都是冷启动。
+
+用法（在项目根目录执行）:
+    python -m pipeline.bench                                    # resource/ 下所有角色各跑一次
+    python -m pipeline.bench resource/Xiao_魈.json --repeat 20 --tts-latency 3 --error-rate 0.05
+    python -m pipeline.bench --stages script voice --report output/bench/report.json
+    python -m pipeline.bench --audio-format aac                 # 压测 AAC 直接封装的视频路径
+"""
+import argparse
+import asyncio
+import dataclasses
+import glob
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from typing import Dict, List, Sequence
+
+import uvicorn
+
+from voice.clone import MEDIA_TYPES, VoiceCloner
+
+from .fake_servers import add_config_arguments, config_from_args, create_app
+from .runner import (
+    DEFAULT_CONCURRENCY,
+    Character,
+    PipelineRunner,
+    StageResult,
+    build_stages,
+    load_characters,
+)
+
+BENCH_DIR = "output/bench"
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法计算分位数，q 取 0~100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(-(-q * len(ordered) // 100))))
+    return ordered[rank - 1]
+
+
+def summarize(results: Sequence[StageResult], stage_names: Sequence[str]) -> Dict[str, dict]:
+    """按阶段汇总：成功/失败数、吞吐量（成功数 / 该阶段从首个开始到最后一个结束的时长）和耗时分位数"""
+    report = {}
+    for name in stage_names:
+        stage_results = [r for r in results if r.stage == name]
+        done = [r for r in stage_results if r.status in ("ok", "cached")]
+        durations = [r.duration for r in done]
+        span = 0.0
+        if done:
+            span = max(r.started + r.duration for r in done) - min(r.started for r in done)
+        report[name] = {
+            "ok": len(done),
+            "failed": sum(r.status == "failed" for r in stage_results),
+            "skipped": sum(r.status == "skipped" for r in stage_results),
+            "throughput": len(done) / span if span > 0 else 0.0,
+            "mean": sum(durations) / len(durations) if durations else 0.0,
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "p99": percentile(durations, 99),
+            "max": max(durations, default=0.0),
+        }
+    return report
+
+
+def merge_streamed_voice(report: Dict[str, dict]) -> Dict[str, dict]:
+    """流式语音时合成在 script 阶段内完成，voice 阶段只确认产物，耗时和吞吐量
+    没有意义：把 script 记为 script+voice，去掉 voice 一行"""
+    merged = {}
+    for name, row in report.items():
+        if name == "voice":
+            continue
+        merged["script+voice" if name == "script" else name] = row
+    return merged
+
+
+def print_report(report: Dict[str, dict], wall_time: float, characters: int):
+    print("\n===== 压测结果 =====")
+    print(f"{'阶段':<12}{'成功':>6}{'失败':>6}{'吞吐(个/s)':>12}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for name, row in report.items():
+        print(
+            f"{name:<14}{row['ok']:>6}{row['failed']:>6}{row['throughput']:>12.2f}"
+            f"{row['p50']:>8.2f}{row['p95']:>8.2f}{row['p99']:>8.2f}{row['max']:>8.2f}"
+        )
+    if wall_time:
+        print(f"{characters} 个角色，总耗时 {wall_time:.1f}s，"
+              f"平均每分钟完成 {characters / wall_time * 60:.1f} 个")
+
+
+class FakeServerThread:
+    """在后台线程中运行模拟服务，用作上下文管理器"""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        if not port:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.app = app
+        self.base_url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("模拟服务启动失败")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def replicate(characters: List[Character], repeat: int, runs_dir: str) -> List[Character]:
+    """把每个角色复制 repeat 份，各自使用独立的工作目录"""
+    if repeat <= 1:
+        return characters
+    copies = []
+    for i in range(repeat):
+        for character in characters:
+            key = f"{character.key}_{i}"
+            workspace = os.path.join(runs_dir, key)
+            os.makedirs(workspace, exist_ok=True)
+            copies.append(dataclasses.replace(character, key=key, workspace=workspace))
+    return copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用本地模拟的 GPT/TTS 服务压测流水线')
+    parser.add_argument('resources', nargs='*',
+                        help='角色 JSON 文件，默认为 resource/*.json')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='每个角色重复的次数，用于放大负载')
+    parser.add_argument('--stages', nargs='+', default=["script", "cover", "voice", "video"],
+                        choices=["script", "cover", "voice", "video"],
+                        help='参与压测的阶段（需包含其依赖的上游阶段）')
+    parser.add_argument('--stream-voice', action='store_true',
+                        help='流式生成文案并逐句合成语音，结果中语音计入 script+voice')
+    parser.add_argument('--audio-format', choices=MEDIA_TYPES, default="wav",
+                        help='TTS 音频格式（模拟服务支持 wav 和 aac）')
+    parser.add_argument('--tts-workers', type=int, default=4,
+                        help='每个角色同时合成的句子数')
+    parser.add_argument('--report', default=None,
+                        help='把结果写入 JSON 文件')
+    parser.add_argument('--keep', action='store_true',
+                        help='保留压测产生的工作目录')
+    for stage_name in DEFAULT_CONCURRENCY:
+        parser.add_argument(f'--{stage_name}-concurrency', type=int,
+                            default=DEFAULT_CONCURRENCY[stage_name],
+                            help=f'{stage_name} 阶段最大并发数')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    if args.stream_voice and args.audio_format != "wav":
+        parser.error("--stream-voice 需要逐句拼接，只支持 wav 格式")
+
+    runs_dir = os.path.join(BENCH_DIR, "runs")
+    resources = args.resources or sorted(glob.glob("resource/*.json"))
+    characters = replicate(
+        load_characters(resources, runs_dir, audio_format=args.audio_format), args.repeat, runs_dir
+    )
+    concurrency = {
+        name: getattr(args, f"{name}_concurrency") for name in DEFAULT_CONCURRENCY
+    }
+    stages = [
+        stage for stage in build_stages(False, concurrency, stream_voice=args.stream_voice)
+        if stage.name in args.stages
+    ]
+    for stage in stages:
+        missing = set(stage.deps) - set(args.stages)
+        if missing:
+            parser.error(f"{stage.name} 阶段依赖 {', '.join(sorted(missing))}")
+
+    app = create_app(config_from_args(args))
+    try:
+        with FakeServerThread(app) as server:
+            # 只影响本进程，.env 中的真实配置不会被加载覆盖
+            os.environ.update({
+                "OPENAI_API_BASE": f"{server.base_url}/v1",
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_MODEL": "fake-gpt",
+                "VOICE_API_URL": f"{server.base_url}/infer_single",
+                "VOICE_API_TOKEN": "bench",
+            })
+            runner = PipelineRunner(characters, stages, tts_workers=args.tts_workers)
+            # 模拟服务的 角色 → 模型 分配与真实服务不同，不能写入正式索引
+            runner.cloner = VoiceCloner(index_path=None, pool_size=64)
+            results = asyncio.run(runner.run())
+            server_stats = app.state.stats.as_dict()
+    finally:
+        if not args.keep:
+            shutil.rmtree(runs_dir, ignore_errors=True)
+
+    report = summarize(results, [stage.name for stage in runner.stages])
+    if args.stream_voice:
+        report = merge_streamed_voice(report)
+    print_report(report, runner.wall_time, len(characters))
+    print(f"模拟服务: {json.dumps(server_stats, ensure_ascii=False)}")
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "characters": len(characters),
+                "wall_time": runner.wall_time,
+                "stages": report,
+                "server": server_stats,
+                "config": vars(args),
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""按内容寻址的阶段产物缓存。
+
+每个阶段的输入（参数 + 输入文件内容）计算出一个指纹，产物和记录输入的
+meta.json 一起保存在 <root>/<阶段>/<指纹>/ 下。重跑流水线时，指纹相同的阶段
+直接取回产物，下游阶段的指纹包含上游产物的内容，因此只有真正变化的部分
+才会重新计算。
+
+产物（包括视频）都是完整副本，每次写入后按最近访问时间淘汰超过有效期或
+超出总大小上限的条目（见 DirectoryCache），缓存不会随每天的运行无限增长。
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from common.cache import DirectoryCache, file_digest
+
+CACHE_DIR = "output/cache/stages"
+
+
+class StageCache(DirectoryCache):
+    def __init__(
+        self,
+        root: str = CACHE_DIR,
+        max_bytes: int = 5 * 1024 * 1024 * 1024,
+        max_age: Optional[float] = 30 * 24 * 3600
+    ):
+        """初始化阶段缓存
+
+        Args:
+            root: 缓存根目录
+            max_bytes: 所有阶段产物的总大小上限（字节）
+            max_age: 条目有效期（秒），超过该时长未被命中的条目会被删除，None 表示永不过期
+        """
+        super().__init__(root, max_bytes, max_age=max_age)
+        self.root = root
+
+    def fingerprint(self, stage: str, params: dict, files: Sequence[str] = ()) -> str:
+        """根据阶段名、参数和输入文件内容计算指纹"""
+        h = hashlib.sha256()
+        h.update(json.dumps(
+            {"stage": stage, "params": params},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        ).encode("utf-8"))
+        for path in files:
+            h.update(file_digest(path).encode("ascii"))
+        return h.hexdigest()
+
+    def _entry_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, key)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """每个 <阶段>/<指纹>/ 目录是一个条目，meta.json 的 mtime 记录最近访问时间"""
+        entries = []
+        for stage_dir in os.scandir(self.root):
+            if not stage_dir.is_dir():
+                continue
+            for entry in os.scandir(stage_dir.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                except FileNotFoundError:
+                    continue  # 正在被其他线程淘汰
+                entries.append((mtime, size, entry.path))
+        return entries
+
+    def fetch(self, stage: str, key: str, dest: str) -> bool:
+        """命中时把产物复制到 dest 并返回 True"""
+        entry = self._entry_dir(stage, key)
+        meta_path = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            artifact = os.path.join(entry, meta["artifact"])
+
+            # 复制而不是硬链接：各阶段会原地覆盖输出文件，硬链接会连带改坏缓存
+            os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+            shutil.copyfile(artifact, dest)
+            self.touch(meta_path)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            # 未写入，或在读取过程中被淘汰
+            self.record(hit=False)
+            return False
+
+        self.record(hit=True)
+        return True
+
+    def store(
+        self,
+        stage: str,
+        key: str,
+        src: str,
+        params: Optional[dict] = None,
+        files: Sequence[str] = ()
+    ):
+        """把阶段产物及其输入指纹写入缓存"""
+        entry = self._entry_dir(stage, key)
+        tmp = self._tmp_path(entry)
+        os.makedirs(tmp, exist_ok=True)
+
+        artifact = os.path.basename(src)
+        shutil.copyfile(src, os.path.join(tmp, artifact))
+        meta = {
+            "stage": stage,
+            "fingerprint": key,
+            "artifact": artifact,
+            "size": os.path.getsize(src),
+            "params": params or {},
+            "inputs": {path: file_digest(path) for path in files},
+            "created_at": time.time(),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # 其他任务已经写入了同一个指纹，保留先到的那份
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
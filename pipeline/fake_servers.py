@@ -0,0 +1,288 @@
+"""本地模拟的 GPT 与 TTS 服务，用于离线压测流水线。
+
+请求和响应的格式与 ChatWithGPT（OpenAI 兼容的 /v1/chat/completions，含流式
+SSE）和 VoiceCloner.clone_voice（返回 audio_url，参考音频不存在时返回
+"参考音频不存在"）所对接的真实服务一致，音频支持 wav 和 aac 两种 media_type。
+延迟、错误率和音频大小都可以配置，不消耗额度，也不受真实服务的限流影响。
+
+用法（在项目根目录执行）:
+    python -m pipeline.fake_servers --port 8765 --tts-latency 2 --error-rate 0.05
+    # 然后把 .env 中的地址指向本地服务:
+    # OPENAI_API_BASE=http://127.0.0.1:8765/v1
+    # VOICE_API_URL=http://127.0.0.1:8765/infer_single
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+import wave
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from common.ffmpeg import get_ffmpeg_exe
+from voice.clone import MODEL_REGIONS
+
+SCRIPT_SENTENCE = "旅行者，早上好呀，新的一天也要元气满满哦。"
+
+
+@dataclass
+class FakeServerConfig:
+    """模拟服务的行为参数，延迟单位均为秒"""
+    llm_latency: float = 1.0             # GPT 首个 token 前的等待时间
+    llm_token_latency: float = 0.002     # 每个输出字符的生成时间
+    script_sentences: int = 10           # 每篇文案的句数
+    tts_latency: float = 1.0             # TTS 请求的固定开销
+    tts_char_latency: float = 0.05       # 每个待合成字符的额外耗时
+    tts_max_concurrency: int = 8         # TTS 同时处理的请求数，超出的排队，模拟限流后端
+    audio_seconds_per_char: float = 0.25  # 每个字符对应的音频时长
+    sample_rate: int = 32000             # 音频采样率，决定下载的数据量
+    jitter: float = 0.2                  # 延迟的随机浮动比例
+    error_rate: float = 0.0              # 返回 5xx 临时错误的概率
+    # 为 True 时每个角色只存在于一个（按名字哈希确定的）地区模型中
+    strict_regions: bool = True
+    audio_dir: Optional[str] = None      # 生成的音频存放目录，默认使用临时目录
+
+
+@dataclass
+class FakeServerStats:
+    chat_requests: int = 0
+    tts_requests: int = 0
+    downloads: int = 0
+    injected_errors: int = 0
+    missing_speaker: int = 0
+    bytes_served: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def speaker_region(speaker_name: str) -> str:
+    """角色所在的模型地区，按名字哈希固定分配"""
+    digest = hashlib.sha256(speaker_name.encode("utf-8")).digest()
+    return MODEL_REGIONS[digest[0] % len(MODEL_REGIONS)]
+
+
+def _fake_script(prompt: str, sentences: int) -> dict:
+    title = prompt.strip()[:8] or "早安提醒"
+    return {"title": f"{title}的问候", "script": SCRIPT_SENTENCE * sentences}
+
+
+def _fake_completion(prompt: str, config: FakeServerConfig) -> str:
+    """按 ChatWithGPT 的解析方式构造回复：单个 JSON 对象，打包请求则为数组"""
+    count = len(re.findall(r"【角色 \d+】", prompt))
+    if count:
+        items = [_fake_script(f"角色{i + 1}", config.script_sentences) for i in range(count)]
+        return json.dumps(items, ensure_ascii=False)
+    return json.dumps(_fake_script(prompt, config.script_sentences), ensure_ascii=False)
+
+
+def _write_wav(path: str, seconds: float, sample_rate: int):
+    """写入指定时长的 16 位单声道 WAV，内容为低幅度噪声"""
+    frames = int(seconds * sample_rate)
+    block = min(frames, sample_rate)
+    noise = bytes(b & 0x0F for b in os.urandom(block * 2))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        written = 0
+        while written < frames:
+            chunk = min(frames - written, block)
+            f.writeframes(noise[:chunk * 2])
+            written += chunk
+
+
+def _write_aac(path: str, seconds: float, sample_rate: int):
+    """用 ffmpeg 生成指定时长的 ADTS 封装 AAC，内容为低幅度噪声"""
+    subprocess.run([
+        get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"anoisesrc=d={seconds:.3f}:r={sample_rate}:a=0.01",
+        "-c:a", "aac", "-b:a", "64k", "-f", "adts", path,
+    ], capture_output=True, check=True)
+
+
+# media_type → (生成函数, 下载时的 Content-Type)
+AUDIO_FORMATS = {
+    "wav": (_write_wav, "audio/wav"),
+    "aac": (_write_aac, "audio/aac"),
+}
+
+
+def create_app(config: Optional[FakeServerConfig] = None) -> FastAPI:
+    """创建同时提供 GPT 与 TTS 接口的应用，统计信息在 app.state.stats 中"""
+    config = config or FakeServerConfig()
+    app = FastAPI(title="Fake GPT & TTS")
+    app.state.config = config
+    app.state.stats = FakeServerStats()
+    audio_dir = config.audio_dir or tempfile.mkdtemp(prefix="fake_tts_")
+    os.makedirs(audio_dir, exist_ok=True)
+    tts_slots = asyncio.Semaphore(config.tts_max_concurrency)
+
+    def jittered(seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - config.jitter, 1 + config.jitter))
+
+    def inject_error() -> bool:
+        if random.random() < config.error_rate:
+            app.state.stats.injected_errors += 1
+            return True
+        return False
+
+    @app.on_event("shutdown")
+    async def cleanup():
+        if not config.audio_dir:
+            shutil.rmtree(audio_dir, ignore_errors=True)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.stats.chat_requests += 1
+        if inject_error():
+            return JSONResponse(status_code=503, content={"error": {"message": "模拟的服务端过载"}})
+
+        messages = body.get("messages", [])
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        content = _fake_completion(prompt, config)
+        model = body.get("model", "fake-gpt")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        await asyncio.sleep(jittered(config.llm_latency))
+
+        if not body.get("stream"):
+            await asyncio.sleep(jittered(config.llm_token_latency * len(content)))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": sum(len(m.get("content", "")) for m in messages),
+                    "completion_tokens": len(content),
+                    "total_tokens": sum(len(m.get("content", "")) for m in messages) + len(content),
+                },
+            }
+
+        async def events():
+            def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }, ensure_ascii=False) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(content), 8):
+                piece = content[start:start + 8]
+                await asyncio.sleep(jittered(config.llm_token_latency * len(piece)))
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/infer_single")
+    async def infer_single(request: Request):
+        payload = await request.json()
+        app.state.stats.tts_requests += 1
+        if not payload.get("access_token"):
+            raise HTTPException(status_code=401, detail="缺少 access_token")
+        media_type = payload.get("media_type", "wav")
+        if media_type not in AUDIO_FORMATS:
+            raise HTTPException(status_code=400, detail=f"模拟服务只支持 {' / '.join(AUDIO_FORMATS)}")
+
+        async with tts_slots:
+            if inject_error():
+                return JSONResponse(status_code=503, content={"msg": "模拟的服务端过载"})
+
+            speaker = payload.get("speaker_name", "")
+            model = payload.get("model_name", "")
+            if config.strict_regions and not model.endswith(speaker_region(speaker)):
+                await asyncio.sleep(jittered(config.tts_latency) * 0.1)
+                app.state.stats.missing_speaker += 1
+                return {"msg": "参考音频不存在", "audio_url": None}
+
+            text = payload.get("text", "")
+            await asyncio.sleep(jittered(config.tts_latency + config.tts_char_latency * len(text)))
+
+            name = f"{uuid.uuid4().hex}.{media_type}"
+            speed = float(payload.get("speed_facter") or 1.0)
+            seconds = max(0.5, len(text) * config.audio_seconds_per_char / speed)
+            writer, _ = AUDIO_FORMATS[media_type]
+            await asyncio.to_thread(
+                writer, os.path.join(audio_dir, name), seconds, config.sample_rate
+            )
+
+        audio_url = str(request.base_url).rstrip("/") + f"/outputs/{name}"
+        return {"msg": "合成成功", "audio_url": audio_url}
+
+    @app.get("/outputs/{name}")
+    async def download(name: str):
+        path = os.path.join(audio_dir, os.path.basename(name))
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="音频不存在")
+        app.state.stats.downloads += 1
+        app.state.stats.bytes_served += os.path.getsize(path)
+        _, content_type = AUDIO_FORMATS[os.path.splitext(path)[1].lstrip(".")]
+        return FileResponse(path, media_type=content_type)
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats.as_dict()
+
+    return app
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """把 FakeServerConfig 的各项参数注册为命令行选项"""
+    defaults = FakeServerConfig()
+    for name, value in defaults.__dict__.items():
+        option = "--" + name.replace("_", "-")
+        if isinstance(value, bool):
+            parser.add_argument(option, type=lambda v: v.lower() in ("1", "true", "yes"),
+                                default=value, help=f"默认 {value}")
+        elif value is None:
+            parser.add_argument(option, default=None)
+        else:
+            parser.add_argument(option, type=type(value), default=value, help=f"默认 {value}")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeServerConfig:
+    return FakeServerConfig(**{
+        name: getattr(args, name) for name in FakeServerConfig().__dict__
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动本地模拟的 GPT 与 TTS 服务')
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    base = f"http://{args.host}:{args.port}"
+    print(f"OPENAI_API_BASE={base}/v1")
+    print(f"VOICE_API_URL={base}/infer_single")
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
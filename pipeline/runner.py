@@ -0,0 +1,592 @@
+"""多角色流水线：在同一进程内完成 文案 → 封面 / 语音 → 视频 → 发布。
+
+取代 auto.sh 中每个角色依次启动五个 Python 进程、通过 output/ 下共享文件传递
+状态的做法。每个角色拥有独立的工作目录 (output/runs/<角色>/)，各阶段按依赖
+关系组成 DAG，并按阶段限制并发数，不同角色的 GPT、TTS、封面渲染和视频编码
+可以互相重叠执行。
+
+用法（在项目根目录执行）:
+    python -m pipeline.runner                                  # resource/ 下所有角色
+    python -m pipeline.runner resource/Xiao_魈.json --publish  # 指定角色并发布
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from image.add_text import DEFAULT_QUALITY, add_artistic_text, resolve_font_path
+from scripts.produce_with_gpt import ChatWithGPT, CompletionCache, ScriptStreamParser
+from video.generate import STILL_FPS, generate_video, plan_threads
+from voice.clone import MEDIA_TYPES, AudioCache, StreamingSynthesizer, VoiceCloner
+
+from .cache import CACHE_DIR, StageCache
+
+SYSTEM_PROMPT_PATH = "scripts/genshin_prompts/system.txt"
+RUNS_DIR = "output/runs"
+GPT_TEMPERATURE = 0.7
+GPT_MAX_TOKENS = 1000
+
+# 封面渲染参数，与实际使用的字体文件一起计入封面阶段的指纹，
+# 换字体或调整质量、描边后不会再命中旧封面
+COVER_OPTIONS = {
+    "font_path": "fonts/SimHei.ttf",
+    "text_color": (255, 255, 255),
+    "outline_color": (0, 0, 0),
+    "outline_width": 3,
+    "quality": DEFAULT_QUALITY,
+    "max_bytes": None,
+}
+
+# 各阶段默认并发数：网络阶段可以多开，CPU 阶段按核数收敛，浏览器发布必须串行
+DEFAULT_CONCURRENCY = {
+    "script": 4,
+    "cover": 2,
+    "voice": 2,
+    "video": 2,
+    "publish": 1,
+}
+
+
+@dataclass
+class Character:
+    """单个角色的输入数据及其独立工作目录"""
+    key: str
+    data: dict
+    image_path: str
+    workspace: str
+    publish_time: Optional[str] = None
+    # 流式模式下语音已在文案阶段合成完毕
+    streamed_voice: bool = False
+    # TTS 返回的音频格式，aac 可直接封装进视频
+    audio_format: str = "wav"
+
+    @property
+    def name(self) -> str:
+        return self.data["name"]
+
+    @property
+    def script_path(self) -> str:
+        return os.path.join(self.workspace, "script.json")
+
+    @property
+    def cover_path(self) -> str:
+        return os.path.join(self.workspace, "image.jpg")
+
+    @property
+    def voice_path(self) -> str:
+        return os.path.join(self.workspace, f"voice.{self.audio_format}")
+
+    @property
+    def video_path(self) -> str:
+        return os.path.join(self.workspace, "video.mp4")
+
+    def load_script(self) -> dict:
+        with open(self.script_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+@dataclass
+class Stage:
+    """流水线中的一个阶段
+
+    func 在线程池中执行，签名为 func(runner, character)，失败时抛出异常。
+    提供 inputs 和 artifact 的阶段可被缓存：inputs(runner, character) 返回
+    (参数字典, 输入文件列表)，artifact(character) 返回该阶段的产物路径。
+    """
+    name: str
+    func: Callable[["PipelineRunner", Character], None]
+    deps: Sequence[str] = ()
+    concurrency: int = 1
+    inputs: Optional[Callable[["PipelineRunner", Character], Tuple[dict, List[str]]]] = None
+    artifact: Optional[Callable[[Character], str]] = None
+
+
+@dataclass
+class StageResult:
+    character: str
+    stage: str
+    status: str  # ok / cached / failed / skipped
+    started: float = 0.0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+def run_script_stage(runner: "PipelineRunner", character: Character):
+    """调用 GPT 生成文案并写入 script.json"""
+    user_data = dict(character.data)
+    response = runner.chat.generate_content(
+        prompt=user_data.get("user_prompt", ""),
+        system_prompt=runner.system_prompt,
+        temperature=GPT_TEMPERATURE,
+        max_tokens=GPT_MAX_TOKENS
+    )
+    if not response:
+        raise RuntimeError("GPT 未返回任何内容")
+
+    runner.chat.save_content(
+        character.script_path, response, user_data, cover_image=character.cover_path
+    )
+    content = character.load_script().get("content")
+    if not isinstance(content, dict) or not content.get("script"):
+        raise ValueError("GPT 回复中未解析出 title/script")
+
+
+def run_streaming_script_stage(runner: "PipelineRunner", character: Character):
+    """流式生成文案，每完成一句就交给 TTS 合成，文案和语音同时产出"""
+    user_data = dict(character.data)
+    parser = ScriptStreamParser()
+    synthesizer = StreamingSynthesizer(
+        runner.cloner, character.name, character.voice_path,
+        max_workers=runner.tts_workers
+    )
+    chunks = []
+    try:
+        for delta in runner.chat.stream_content(
+            prompt=user_data.get("user_prompt", ""),
+            system_prompt=runner.system_prompt,
+            temperature=GPT_TEMPERATURE,
+            max_tokens=GPT_MAX_TOKENS
+        ):
+            chunks.append(delta)
+            for sentence in parser.feed(delta):
+                synthesizer.submit(sentence)
+        for sentence in parser.close():
+            synthesizer.submit(sentence)
+    except Exception:
+        synthesizer.close()
+        raise
+
+    runner.chat.save_content(
+        character.script_path, "".join(chunks), user_data, cover_image=character.cover_path
+    )
+    content = character.load_script().get("content")
+    if not isinstance(content, dict) or not content.get("script"):
+        synthesizer.close()
+        raise ValueError("GPT 回复中未解析出 title/script")
+
+    synthesizer.finish()
+    character.streamed_voice = True
+
+
+def _cover_texts(script: dict) -> Tuple[str, str]:
+    return script["content"]["title"], f"让全世界都听见 {script['name']}"
+
+
+def run_cover_stage(runner: "PipelineRunner", character: Character):
+    """在角色原图上绘制标题，生成封面"""
+    title, subtitle = _cover_texts(character.load_script())
+    add_artistic_text(
+        character.image_path,
+        title,
+        subtitle,
+        output_path=character.cover_path,
+        **COVER_OPTIONS
+    )
+
+
+def run_voice_stage(runner: "PipelineRunner", character: Character):
+    """用角色声音朗读文案"""
+    if character.streamed_voice and os.path.exists(character.voice_path):
+        return
+    script = character.load_script()
+    runner.cloner.clone_voice_parallel(
+        text=script["content"]["script"],
+        speaker_name=script["name"],
+        output_path=character.voice_path,
+        max_workers=runner.tts_workers,
+        media_type=character.audio_format
+    )
+
+
+def run_video_stage(runner: "PipelineRunner", character: Character):
+    """封面 + 语音合成视频"""
+    generate_video(
+        character.cover_path, character.voice_path, character.video_path,
+        threads=runner.video_threads
+    )
+
+
+def script_inputs(runner: "PipelineRunner", character: Character):
+    return {
+        "model": runner.chat.model,
+        "system_prompt": runner.system_prompt,
+        "user_data": character.data,
+        "cover_image": character.cover_path,
+        "temperature": GPT_TEMPERATURE,
+        "max_tokens": GPT_MAX_TOKENS,
+    }, []
+
+
+def cover_inputs(runner: "PipelineRunner", character: Character):
+    title, subtitle = _cover_texts(character.load_script())
+    font_path, font_index = resolve_font_path(COVER_OPTIONS["font_path"])
+    params = dict(COVER_OPTIONS, title=title, subtitle=subtitle, font=[font_path, font_index])
+    return params, [character.image_path, font_path]
+
+
+def voice_inputs(runner: "PipelineRunner", character: Character):
+    # 只依赖朗读文本和角色，标题变化不会触发重新合成
+    script = character.load_script()
+    return {
+        "text": script["content"]["script"],
+        "speaker_name": script["name"],
+        "media_type": character.audio_format,
+    }, []
+
+
+def video_inputs(runner: "PipelineRunner", character: Character):
+    return {"engine": "ffmpeg", "fps": STILL_FPS}, [character.cover_path, character.voice_path]
+
+
+def run_publish_stage(runner: "PipelineRunner", character: Character):
+    """定时发布到小红书"""
+    # selenium 只有发布阶段需要，按需导入
+    from xhs.publish import publish_xhs_content
+
+    success = publish_xhs_content(
+        scripts_data=character.load_script(),
+        publish_time=character.publish_time,
+        video_path=character.video_path,
+        upload_profile=runner.upload_profile
+    )
+    if not success:
+        raise RuntimeError("发布失败")
+
+
+def build_stages(
+    publish: bool = False,
+    concurrency: Optional[Dict[str, int]] = None,
+    stream_voice: bool = False
+) -> List[Stage]:
+    """构建默认的阶段 DAG
+
+    script → cover ┐
+           → voice ┴→ video → publish
+
+    stream_voice 为 True 时，script 阶段边生成边合成语音，voice 阶段只负责
+    确认产物（以及文案命中缓存时的正常合成）。
+    """
+    limits = dict(DEFAULT_CONCURRENCY)
+    limits.update(concurrency or {})
+
+    stages = [
+        Stage("script", run_streaming_script_stage if stream_voice else run_script_stage,
+              (), limits["script"], script_inputs, lambda c: c.script_path),
+        Stage("cover", run_cover_stage, ("script",), limits["cover"],
+              cover_inputs, lambda c: c.cover_path),
+        Stage("voice", run_voice_stage, ("script",), limits["voice"],
+              voice_inputs, lambda c: c.voice_path),
+        Stage("video", run_video_stage, ("cover", "voice"), limits["video"],
+              video_inputs, lambda c: c.video_path),
+    ]
+    if publish:
+        stages.append(Stage("publish", run_publish_stage, ("video",), limits["publish"]))
+    return stages
+
+
+def load_characters(
+    resource_paths: Sequence[str],
+    runs_dir: str = RUNS_DIR,
+    start_date: Optional[str] = None,
+    start_time: str = "18:00",
+    audio_format: str = "wav"
+) -> List[Character]:
+    """一次性读取所有角色配置，并为每个角色分配工作目录和发布时间
+
+    与 auto.sh 一致：第 i 个角色在起始日期后第 i+1 天的 start_time 发布。
+    """
+    current_date = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now()
+    characters = []
+    for resource_path in resource_paths:
+        key = os.path.splitext(os.path.basename(resource_path))[0]
+        image_path = os.path.splitext(resource_path)[0] + ".jpg"
+        if not os.path.exists(image_path):
+            print(f"警告: 找不到 {key} 的图片 {image_path}，跳过")
+            continue
+
+        with open(resource_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        current_date += timedelta(days=1)
+        workspace = os.path.join(runs_dir, key)
+        os.makedirs(workspace, exist_ok=True)
+        characters.append(Character(
+            key=key,
+            data=data,
+            image_path=image_path,
+            workspace=workspace,
+            publish_time=f"{current_date.strftime('%Y-%m-%d')} {start_time}",
+            audio_format=audio_format
+        ))
+    return characters
+
+
+def _topological_order(stages: Sequence[Stage]) -> List[Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"阶段依赖存在环: {stage.name}")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"阶段 {stage.name} 依赖了不存在的阶段 {dep}")
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+class PipelineRunner:
+    def __init__(
+        self,
+        characters: Sequence[Character],
+        stages: Sequence[Stage],
+        system_prompt_path: str = SYSTEM_PROMPT_PATH,
+        cache: Optional[StageCache] = None,
+        completion_cache: Optional[CompletionCache] = None,
+        audio_cache: Optional[AudioCache] = None,
+        tts_workers: int = 2
+    ):
+        """初始化流水线
+
+        Args:
+            characters: 待处理的角色列表
+            stages: 阶段列表，按依赖关系自动排序
+            system_prompt_path: GPT 系统提示词文件
+            cache: 阶段产物缓存，为 None 时每次都重新生成
+            completion_cache: GPT 回复缓存
+            audio_cache: 语音合成结果缓存
+            tts_workers: 每个角色同时合成的句子数
+        """
+        self.characters = list(characters)
+        self.stages = _topological_order(stages)
+        self.system_prompt_path = system_prompt_path
+        self.cache = cache
+        self.completion_cache = completion_cache
+        self.audio_cache = audio_cache
+        self.tts_workers = tts_workers
+        self.results: List[StageResult] = []
+        self.wall_time = 0.0
+
+        self.chat = None
+        self.cloner = None
+        self.video_threads = 0
+        # 发布前转码的上限配置，为 None 时原样上传
+        self.upload_profile = None
+        self.system_prompt = ""
+
+    def _prepare(self):
+        """在主线程中创建各阶段共享的客户端，只初始化一次；已预先设置的客户端保持不变"""
+        names = {stage.name for stage in self.stages}
+        if "script" in names:
+            if self.chat is None:
+                self.chat = ChatWithGPT(cache=self.completion_cache)
+            self.system_prompt = self.chat.read_prompt_from_file(self.system_prompt_path)
+            if not self.system_prompt:
+                raise ValueError(f"系统提示词为空: {self.system_prompt_path}")
+        video = next((stage for stage in self.stages if stage.name == "video"), None)
+        if video:
+            # 同时运行的编码器平分 CPU，避免各自按核数开线程导致超额订阅
+            _, self.video_threads = plan_threads(video.concurrency)
+        needs_voice = "voice" in names or any(
+            stage.func is run_streaming_script_stage for stage in self.stages
+        )
+        if needs_voice and self.cloner is None:
+            self.cloner = VoiceCloner(audio_cache=self.audio_cache)
+
+    def _cache_lookup(self, stage: Stage, character: Character) -> Optional[Tuple[str, dict, list]]:
+        """返回 (指纹, 参数, 输入文件)；命中缓存时直接把产物放到工作目录并返回 None"""
+        params, files = stage.inputs(self, character)
+        key = self.cache.fingerprint(stage.name, params, files)
+        if self.cache.fetch(stage.name, key, stage.artifact(character)):
+            return None
+        return key, params, files
+
+    def _execute(self, stage: Stage, character: Character, cache_entry):
+        stage.func(self, character)
+        if cache_entry:
+            key, params, files = cache_entry
+            try:
+                self.cache.store(stage.name, key, stage.artifact(character), params, files)
+            except Exception as e:
+                print(f"[{character.key}] 写入 {stage.name} 缓存失败: {e}")
+
+    async def _run_stage(self, stage, character, deps, semaphore, executor, t0):
+        if not all(await asyncio.gather(*deps)):
+            self.results.append(StageResult(character.key, stage.name, "skipped"))
+            return False
+
+        loop = asyncio.get_running_loop()
+        cache_entry = None
+        if self.cache and stage.inputs and stage.artifact:
+            started = time.perf_counter()
+            try:
+                cache_entry = await loop.run_in_executor(
+                    executor, self._cache_lookup, stage, character
+                )
+            except Exception as e:
+                print(f"[{character.key}] 读取 {stage.name} 缓存失败，重新生成: {e}")
+            else:
+                if cache_entry is None:
+                    duration = time.perf_counter() - started
+                    print(f"[{character.key}] ↺ {stage.name} 命中缓存")
+                    self.results.append(StageResult(
+                        character.key, stage.name, "cached", started - t0, duration
+                    ))
+                    return True
+
+        async with semaphore:
+            started = time.perf_counter()
+            print(f"[{character.key}] ▶ {stage.name}")
+            try:
+                await loop.run_in_executor(
+                    executor, self._execute, stage, character, cache_entry
+                )
+            except Exception as e:
+                duration = time.perf_counter() - started
+                print(f"[{character.key}] ✗ {stage.name} 失败: {e}")
+                traceback.print_exc()
+                self.results.append(StageResult(
+                    character.key, stage.name, "failed", started - t0, duration, str(e)
+                ))
+                return False
+
+            duration = time.perf_counter() - started
+            print(f"[{character.key}] ✓ {stage.name} ({duration:.1f}s)")
+            self.results.append(StageResult(
+                character.key, stage.name, "ok", started - t0, duration
+            ))
+            return True
+
+    async def _run_character(self, character, semaphores, executor, t0):
+        futures = {}
+        for stage in self.stages:
+            deps = [futures[dep] for dep in stage.deps]
+            futures[stage.name] = asyncio.ensure_future(self._run_stage(
+                stage, character, deps, semaphores[stage.name], executor, t0
+            ))
+        await asyncio.gather(*futures.values())
+
+    async def run(self) -> List[StageResult]:
+        """并发处理所有角色，返回每个角色每个阶段的执行结果"""
+        self._prepare()
+        self.results = []
+        semaphores = {stage.name: asyncio.Semaphore(stage.concurrency) for stage in self.stages}
+        max_workers = sum(stage.concurrency for stage in self.stages)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+            await asyncio.gather(*(
+                self._run_character(character, semaphores, executor, t0)
+                for character in self.characters
+            ))
+        self.wall_time = time.perf_counter() - t0
+        return self.results
+
+    def print_summary(self):
+        print("\n===== 流水线结果 =====")
+        for character in self.characters:
+            cells = []
+            for stage in self.stages:
+                result = next(
+                    (r for r in self.results if r.character == character.key and r.stage == stage.name),
+                    None
+                )
+                if result is None:
+                    continue
+                mark = {"ok": "✓", "cached": "↺", "failed": "✗", "skipped": "-"}[result.status]
+                cells.append(f"{stage.name} {mark} {result.duration:.1f}s")
+            print(f"{character.key}: " + " | ".join(cells))
+
+        busy = sum(r.duration for r in self.results)
+        print(f"阶段累计耗时 {busy:.1f}s，实际耗时 {self.wall_time:.1f}s")
+        if self.completion_cache:
+            stats = self.completion_cache.stats()
+            print(f"GPT 缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次")
+        if self.audio_cache:
+            stats = self.audio_cache.stats()
+            print(f"语音缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次")
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='多角色内容生产流水线')
+    parser.add_argument('resources', nargs='*',
+                        help='角色 JSON 文件，默认处理 resource/*.json')
+    parser.add_argument('--runs-dir', default=RUNS_DIR,
+                        help='每个角色工作目录的根目录')
+    parser.add_argument('--publish', action='store_true',
+                        help='生成视频后定时发布到小红书')
+    parser.add_argument('--transcode', action='store_true',
+                        help='发布前检查视频，超出分辨率/码率/大小上限时重新编码')
+    parser.add_argument('--start-date', default=None,
+                        help='起始日期 YYYY-MM-DD，默认今天，第一个角色在次日发布')
+    parser.add_argument('--start-time', default="18:00",
+                        help='每天的发布时间 HH:MM')
+    parser.add_argument('--stream-voice', action='store_true',
+                        help='流式生成文案，每完成一句立即合成语音')
+    parser.add_argument('--audio-format', choices=MEDIA_TYPES, default="wav",
+                        help='TTS 音频格式，aac 体积小且合成视频时无需重新编码音频')
+    parser.add_argument('--tts-workers', type=int, default=4,
+                        help='每个角色同时合成的句子数')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='阶段产物缓存目录')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='忽略缓存，所有阶段重新生成')
+    for stage_name in DEFAULT_CONCURRENCY:
+        parser.add_argument(f'--{stage_name}-concurrency', type=int,
+                            default=DEFAULT_CONCURRENCY[stage_name],
+                            help=f'{stage_name} 阶段最大并发数')
+    args = parser.parse_args()
+
+    resources = args.resources or sorted(glob.glob("resource/*.json"))
+    if args.stream_voice and args.audio_format != "wav":
+        parser.error("--stream-voice 需要逐句拼接，只支持 wav 格式")
+    characters = load_characters(
+        resources, args.runs_dir, args.start_date, args.start_time, args.audio_format
+    )
+    concurrency = {
+        name: getattr(args, f"{name}_concurrency") for name in DEFAULT_CONCURRENCY
+    }
+
+    cache = None if args.no_cache else StageCache(args.cache_dir)
+    completion_cache = None if args.no_cache else CompletionCache()
+    audio_cache = None if args.no_cache else AudioCache()
+    runner = PipelineRunner(
+        characters,
+        build_stages(args.publish, concurrency, stream_voice=args.stream_voice),
+        cache=cache,
+        completion_cache=completion_cache,
+        audio_cache=audio_cache,
+        tts_workers=args.tts_workers
+    )
+    if args.transcode:
+        from xhs.transcode import UploadProfile
+        runner.upload_profile = UploadProfile()
+    results = asyncio.run(runner.run())
+    runner.print_summary()
+
+    if any(r.status in ("failed", "skipped") for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,187 @@
 import os
 import json
-from openai import OpenAI
+import time
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from openai import AsyncOpenAI, OpenAI
 import argparse
 from dotenv import load_dotenv
-from typing import Union
+from typing import Iterator, List, Optional, Union
 import re
 
+from common.cache import DirectoryCache
+
+# 打包模式下附加在角色设定前的说明，要求模型按顺序返回 JSON 数组
+PACKED_PROMPT_HEADER = """下面依次给出 {count} 个角色的设定。请分别扮演每个角色，按照系统提示的要求为每个角色创作文案。
+只返回一个 JSON 数组，数组长度为 {count}，第 i 项对应第 i 个角色，每一项的格式为 {{"title": "...", "script": "..."}}，不要输出其他内容。"""
+
+# 句末标点，流式解析时遇到这些字符即认为一句话结束
+SENTENCE_ENDINGS = "。！？!?；;…~～\n"
+
+
+@dataclass
+class GenerationResult:
+    """批量生成中单个请求的结果"""
+    index: int
+    prompt: str
+    content: str = ""
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ScriptStreamParser:
+    """从流式返回的 JSON 文本中增量提取 script 字段，并按句切分
+    
+    用法：每收到一段增量文本调用 feed()，返回其中新完成的句子；
+    流结束后调用 close() 取出剩余内容。
+    """
+
+    _ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+
+    def __init__(self, field: str = "script"):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos = None  # script 字符串内容中下一个待解析字符的位置
+        self._sentence = []
+        self._pending_end = False
+        self.done = False
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta
+        sentences = []
+        if self.done:
+            return sentences
+        if self._pos is None:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return sentences
+            self._pos = match.end()
+
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            ch = buffer[self._pos]
+            if ch == '\\':
+                # 转义序列可能被切在两段增量之间，不完整时等待下一段
+                if self._pos + 1 >= len(buffer):
+                    break
+                escape = buffer[self._pos + 1]
+                if escape == 'u':
+                    if self._pos + 6 > len(buffer):
+                        break
+                    try:
+                        ch = chr(int(buffer[self._pos + 2:self._pos + 6], 16))
+                    except ValueError:
+                        ch = ''
+                    self._pos += 6
+                else:
+                    ch = self._ESCAPES.get(escape, escape)
+                    self._pos += 2
+            elif ch == '"':
+                self._pos += 1
+                self.done = True
+                self._flush(sentences)
+                break
+            else:
+                self._pos += 1
+
+            # 连续的句末标点（如“！！”“……”）归入同一句
+            if self._pending_end and ch not in SENTENCE_ENDINGS:
+                self._flush(sentences)
+            self._sentence.append(ch)
+            self._pending_end = ch in SENTENCE_ENDINGS
+        return sentences
+
+    def close(self) -> List[str]:
+        sentences = []
+        self._flush(sentences)
+        self.done = True
+        return sentences
+
+    def _flush(self, sentences: List[str]):
+        sentence = "".join(self._sentence).strip()
+        self._sentence = []
+        self._pending_end = False
+        if sentence:
+            sentences.append(sentence)
+
+
+class CompletionCache(DirectoryCache):
+    """GPT 回复的磁盘缓存
+    
+    以 (model, system_prompt, user_prompt, temperature, max_tokens) 为键，每条
+    回复保存为 <cache_dir>/<sha256>.json。超过 max_age 的条目视为未命中；
+    条目数或总大小超限时，按最近访问时间淘汰最旧的条目（见 DirectoryCache）。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "output/cache/gpt",
+        max_entries: int = 1000,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_age: Optional[float] = 30 * 24 * 3600,
+    ):
+        """初始化缓存
+        
+        Args:
+            cache_dir: 缓存目录
+            max_entries: 最多保留的条目数
+            max_bytes: 缓存总大小上限（字节）
+            max_age: 条目有效期（秒），None 表示永不过期
+        """
+        super().__init__(cache_dir, max_bytes, max_entries=max_entries, max_age=max_age)
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str,
+                 temperature: float, max_tokens: int) -> str:
+        payload = json.dumps(
+            [model, system_prompt, prompt, temperature, max_tokens],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.max_age is not None and time.time() - entry["created_at"] > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            self.touch(path)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.record(hit=False)
+            return None
+
+        self.record(hit=True)
+        return entry["content"]
+
+    def put(self, key: str, content: str):
+        """写入缓存并按需淘汰旧条目"""
+        path = self._path(key)
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "content": content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+
 class ChatWithGPT:
-    def __init__(self):
+    def __init__(self, cache: Optional[CompletionCache] = None):
         """初始化 ChatWithGPT 类。
         
         该构造函数从 .env 文件中获取 OpenAI API 密钥、基础 URL 和模型。
         如果缺少任一配置，将抛出 ValueError 异常。
+        
+        Args:
+            cache: 可选的回复缓存，相同输入直接返回缓存的回复
         """
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.api_base = os.getenv("OPENAI_API_BASE")
@@ -20,38 +190,268 @@ class ChatWithGPT:
         if not self.api_key or not self.api_base or not self.model:
             raise ValueError("需要提供 OpenAI API 密钥、基础 URL 和模型")
 
+        self.cache = cache
+
+        # 客户端按需创建并复用，保持连接池
+        self._client = None
+        self._async_client = None
+        self._async_client_loop = None
+
+    @property
+    def client(self) -> OpenAI:
+        """共享的同步客户端"""
+        if self._client is None:
+            self._client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """共享的异步客户端，绑定到当前事件循环"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.api_base)
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def aclose(self):
+        """关闭异步客户端的连接池"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+            self._async_client_loop = None
+
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: str) -> List[dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _cache_key(self, prompt, system_prompt, temperature, max_tokens) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return CompletionCache.make_key(
+            self.model, system_prompt, prompt, temperature, max_tokens
+        )
+
     def generate_content(
         self,
         prompt: str,
         system_prompt: str,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        use_cache: bool = True,
     ) -> str:
-        """生成文案内容"""
+        """生成文案内容
+        
+        use_cache 为 False 时跳过缓存读取，强制请求新的文案（结果仍会写回缓存）。
+        """
+        key = self._cache_key(prompt, system_prompt, temperature, max_tokens)
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
         try:
-            client = OpenAI(
-                api_key=self.api_key,
-                base_url=self.api_base
-            )
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response = client.chat.completions.create(
+            response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=self._build_messages(prompt, system_prompt),
                 temperature=temperature,
                 max_tokens=max_tokens
             )
             
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if key and content:
+                self.cache.put(key, content)
+            return content
             
         except Exception as e:
             print(f"生成内容时发生错误: {str(e)}")
             return ""
 
+    def stream_content(
+        self,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """流式生成文案，逐段返回增量文本，出错时抛出异常
+        
+        命中缓存时一次性返回完整内容。
+        """
+        key = self._cache_key(prompt, system_prompt, temperature, max_tokens)
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        chunks = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+
+        content = "".join(chunks)
+        if not content:
+            raise ValueError("GPT 返回了空内容")
+        if key:
+            self.cache.put(key, content)
+
+    async def agenerate_content(
+        self,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+    ) -> str:
+        """异步生成文案内容，出错时抛出异常"""
+        key = self._cache_key(prompt, system_prompt, temperature, max_tokens)
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        content = response.choices[0].message.content
+        if not content:
+            raise ValueError("GPT 返回了空内容")
+        if key:
+            self.cache.put(key, content)
+        return content
+
+    async def generate_batch(
+        self,
+        prompts: List[str],
+        system_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        concurrency: int = 4,
+        use_cache: bool = True,
+    ) -> List[GenerationResult]:
+        """并发生成多个角色的文案
+        
+        Args:
+            prompts: 角色提示词列表
+            system_prompt: 系统提示词
+            temperature: 温度
+            max_tokens: 最大 token 数
+            concurrency: 同时进行的请求数上限
+            use_cache: 为 False 时跳过缓存读取
+        
+        Returns:
+            List[GenerationResult]: 与 prompts 顺序一致的结果，失败项带有 error
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(index: int, prompt: str) -> GenerationResult:
+            async with semaphore:
+                try:
+                    content = await self.agenerate_content(
+                        prompt, system_prompt, temperature, max_tokens, use_cache
+                    )
+                    return GenerationResult(index, prompt, content=content)
+                except Exception as e:
+                    print(f"第 {index} 条文案生成失败: {str(e)}")
+                    return GenerationResult(index, prompt, error=str(e))
+
+        return await asyncio.gather(*(
+            run_one(index, prompt) for index, prompt in enumerate(prompts)
+        ))
+
+    def generate_packed(
+        self,
+        prompts: List[str],
+        system_prompt: str,
+        pack_size: int = 4,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+    ) -> List[GenerationResult]:
+        """把多个角色打包进一次请求生成文案
+        
+        每 pack_size 个角色共用一次请求（系统提示词只发送一次），要求模型返回
+        JSON 数组后按顺序拆分。解析失败或缺失的条目自动退回单独请求。
+        
+        Args:
+            prompts: 角色提示词列表
+            system_prompt: 系统提示词
+            pack_size: 每次请求包含的角色数
+            temperature: 温度
+            max_tokens: 单个角色的最大 token 数，打包请求按角色数放大
+            use_cache: 为 False 时跳过缓存读取
+        
+        Returns:
+            List[GenerationResult]: 与 prompts 顺序一致的结果
+        """
+        results: List[Optional[GenerationResult]] = [None] * len(prompts)
+        for start in range(0, len(prompts), pack_size):
+            group = prompts[start:start + pack_size]
+            packed_prompt = PACKED_PROMPT_HEADER.format(count=len(group)) + "".join(
+                f"\n\n【角色 {i + 1}】\n{prompt}" for i, prompt in enumerate(group)
+            )
+            response = self.generate_content(
+                packed_prompt, system_prompt, temperature, max_tokens * len(group), use_cache
+            )
+            items = self._parse_packed_response(response, len(group))
+            for offset, item in enumerate(items):
+                if item is not None:
+                    results[start + offset] = GenerationResult(
+                        start + offset, group[offset],
+                        content=json.dumps(item, ensure_ascii=False)
+                    )
+
+        for index, prompt in enumerate(prompts):
+            if results[index] is not None:
+                continue
+            print(f"第 {index} 条打包结果无效，改为单独请求")
+            content = self.generate_content(
+                prompt, system_prompt, temperature, max_tokens, use_cache
+            )
+            results[index] = GenerationResult(
+                index, prompt, content=content,
+                error=None if content else "生成内容失败"
+            )
+        return results
+
+    @staticmethod
+    def _parse_packed_response(response: str, count: int) -> List[Optional[dict]]:
+        """从打包请求的回复中解析出 count 个 {title, script}，无效条目为 None"""
+        items: List[Optional[dict]] = [None] * count
+        json_match = re.search(r'\[.*\]', response or "", re.DOTALL)
+        if not json_match:
+            return items
+        try:
+            data = json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            print(f"打包结果 JSON 解析错误: {str(e)}")
+            return items
+        if not isinstance(data, list):
+            return items
+
+        for index, item in enumerate(data[:count]):
+            if isinstance(item, dict) and item.get("title") and item.get("script"):
+                items[index] = {"title": item["title"], "script": item["script"]}
+        return items
+
     def read_prompt_from_file(self, file_path: str, is_json: bool = False) -> Union[str, dict]:
         """从文件中读取内容
         
@@ -76,13 +476,20 @@ class ChatWithGPT:
             print(f"读取文件时发生错误：{str(e)}")
             return ""
 
-    def save_content(self, file_path: str, gpt_response: str, user_data: dict):
+    def save_content(
+        self,
+        file_path: str,
+        gpt_response: str,
+        user_data: dict,
+        cover_image: str = "output/image.jpg",
+    ):
         """保存合并后的内容到文件
         
         Args:
             file_path: 输出文件路径
             gpt_response: GPT 生成的回复
             user_data: 用户的 JSON 数据
+            cover_image: 封面图片路径
         """
         print("gpt_response", gpt_response)
         try:
@@ -104,7 +511,7 @@ class ChatWithGPT:
             user_data['content'] = gpt_response
         
         try:
-            user_data['cover_image'] = "output/image.jpg"
+            user_data['cover_image'] = cover_image
 
             name = user_data['name']
             user_data['content_extra'] = f"""{name}的提醒服务，把喜欢的角色语音设为提醒，让{name}的声音陪伴你的每一天，简单几步就能设置，手机通用哦~，如果有需要定制的内容，可以私信我哦~，创作不易求个关注\n自定义闹钟设置教程：可以看主页的设置置顶合集\n\nGPT-SoVITS开发者：@花儿不哭\n模型训练者：@红血球AE3803 & @白菜工厂1145号员工\n推理特化包适配 & 在线推理：@AI-Hobbyist"""
@@ -113,6 +520,43 @@ class ChatWithGPT:
         except Exception as e:
             print(f"保存文件时发生错误：{str(e)}")
 
+async def generate_all(chat: ChatWithGPT, system_prompt: str, data_paths: List[str],
+                       output_dir: str, concurrency: int, use_cache: bool = True,
+                       pack_size: int = 1) -> int:
+    """为多个角色生成文案，返回失败数
+    
+    pack_size 大于 1 时每次请求打包多个角色，否则每个角色一个请求并发执行。
+    """
+    user_datas = [chat.read_prompt_from_file(path, is_json=True) for path in data_paths]
+    prompts = [user_data.get('user_prompt', '') for user_data in user_datas]
+    if pack_size > 1:
+        results = await asyncio.to_thread(
+            chat.generate_packed, prompts, system_prompt, pack_size, use_cache=use_cache
+        )
+    else:
+        try:
+            results = await chat.generate_batch(
+                prompts,
+                system_prompt,
+                concurrency=concurrency,
+                use_cache=use_cache
+            )
+        finally:
+            await chat.aclose()
+
+    os.makedirs(output_dir, exist_ok=True)
+    failed = 0
+    for path, user_data, result in zip(data_paths, user_datas, results):
+        if not result.ok:
+            print(f"{path} 生成失败: {result.error}")
+            failed += 1
+            continue
+        name = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, f"{name}.json")
+        print(f"保存到 {output_path}")
+        chat.save_content(output_path, result.content, user_data)
+    return failed
+
 # 使用示例
 if __name__ == "__main__":
     # 加载 .env 文件
@@ -120,26 +564,51 @@ if __name__ == "__main__":
     
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='生成AI文案内容')
-    parser.add_argument('user_data', type=str,
-                        help='用户数据JSON文件路径')
+    parser.add_argument('user_data', type=str, nargs='+',
+                        help='用户数据JSON文件路径，传入多个时并发生成')
+    parser.add_argument('--output-dir', type=str, default='output/scripts',
+                        help='批量生成时的输出目录')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='批量生成时的最大并发请求数')
+    parser.add_argument('--pack', type=int, default=1,
+                        help='批量生成时每次请求打包的角色数，大于 1 时启用打包模式')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='启用 GPT 回复缓存并指定缓存目录')
+    parser.add_argument('--fresh', action='store_true',
+                        help='跳过缓存读取，强制重新生成')
     
     args = parser.parse_args()
     
     # 创建 ChatWithGPT 实例，从环境变量读取 API key
-    chat = ChatWithGPT()
+    cache = CompletionCache(args.cache_dir) if args.cache_dir else None
+    chat = ChatWithGPT(cache=cache)
     
     # 读取 prompts
     system_prompt = chat.read_prompt_from_file('scripts/genshin_prompts/system.txt', is_json=False)
-    print(args.user_data)
-    user_data = chat.read_prompt_from_file(args.user_data, is_json=True)
+
+    if len(args.user_data) > 1:
+        failed = asyncio.run(generate_all(
+            chat, system_prompt, args.user_data, args.output_dir, args.concurrency,
+            use_cache=not args.fresh, pack_size=args.pack
+        ))
+        if cache:
+            print(f"缓存统计: {cache.stats()}")
+        raise SystemExit(1 if failed else 0)
+
+    user_data_path = args.user_data[0]
+    print(user_data_path)
+    user_data = chat.read_prompt_from_file(user_data_path, is_json=True)
     print("user_data", user_data)
     user_prompt = user_data.get('user_prompt', '')
 
     # 获取 GPT 回复
     response = chat.generate_content(
         prompt=user_prompt,
-        system_prompt=system_prompt
+        system_prompt=system_prompt,
+        use_cache=not args.fresh
     )
+    if cache:
+        print(f"缓存统计: {cache.stats()}")
     
     # 保存合并后的内容
     print("保持到 output/script.json")
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from common.cache import DirectoryCache, file_digest
+from pipeline.cache import StageCache
+from scripts.produce_with_gpt import CompletionCache
+from voice.clone import AudioCache
+from xhs import download_cache
+from xhs.download_cache import DownloadCache
+
+
+def write(path, data=b"x", mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_file_digest_follows_content_changes(tmp_path):
+    path = write(tmp_path / "a.bin", b"first", mtime=1_000_000)
+    first = file_digest(path)
+    assert file_digest(path) == first
+
+    write(path, b"second", mtime=2_000_000)
+    assert file_digest(path) != first
+
+
+def test_directory_cache_evicts_least_recently_used(tmp_path):
+    cache = DirectoryCache(str(tmp_path), max_bytes=1 << 20, max_entries=2)
+    now = time.time()
+    write(tmp_path / "old", mtime=now - 30)
+    write(tmp_path / "mid", mtime=now - 20)
+    write(tmp_path / "new", mtime=now - 10)
+    write(tmp_path / "partial.123.456.tmp", mtime=now - 100)
+
+    cache.touch(str(tmp_path / "old"))
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ["new", "old", "partial.123.456.tmp"]
+
+
+def test_directory_cache_evicts_by_size_and_age(tmp_path):
+    cache = DirectoryCache(str(tmp_path), max_bytes=150, max_age=60)
+    now = time.time()
+    write(tmp_path / "expired", b"x", mtime=now - 120)
+    write(tmp_path / "a", b"x" * 100, mtime=now - 20)
+    write(tmp_path / "b", b"x" * 100, mtime=now - 10)
+
+    cache.evict()
+
+    assert os.listdir(tmp_path) == ["b"]
+
+
+def test_completion_cache_round_trip_and_expiry(tmp_path):
+    cache = CompletionCache(str(tmp_path), max_age=60)
+    key = CompletionCache.make_key("model", "system", "prompt", 0.7, 1000)
+    assert key != CompletionCache.make_key("model", "system", "prompt", 0.8, 1000)
+
+    assert cache.get(key) is None
+    cache.put(key, "文案")
+    assert cache.get(key) == "文案"
+
+    path = tmp_path / f"{key}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.time() - 120, "content": "文案"}, f)
+    assert cache.get(key) is None
+    assert not path.exists()
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_audio_cache_ignores_access_token(tmp_path):
+    cache = AudioCache(str(tmp_path / "tts"))
+    key = AudioCache.make_key({"text": "你好", "access_token": "a"})
+    assert key == AudioCache.make_key({"text": "你好", "access_token": "b"})
+
+    output = str(tmp_path / "out" / "voice.wav")
+    assert not cache.get(key, "wav", output)
+    cache.put(key, "wav", write(tmp_path / "src.wav", b"RIFF"))
+    assert cache.get(key, "wav", output)
+    with open(output, "rb") as f:
+        assert f.read() == b"RIFF"
+
+
+def test_stage_cache_fingerprint_covers_params_and_file_content(tmp_path):
+    cache = StageCache(str(tmp_path / "stages"))
+    source = write(tmp_path / "image.jpg", b"one", mtime=1_000_000)
+
+    key = cache.fingerprint("cover", {"title": "a"}, [source])
+    assert key == cache.fingerprint("cover", {"title": "a"}, [source])
+    assert key != cache.fingerprint("cover", {"title": "b"}, [source])
+    assert key != cache.fingerprint("video", {"title": "a"}, [source])
+
+    write(source, b"two", mtime=2_000_000)
+    assert key != cache.fingerprint("cover", {"title": "a"}, [source])
+
+
+def test_stage_cache_store_and_fetch(tmp_path):
+    cache = StageCache(str(tmp_path / "stages"))
+    source = write(tmp_path / "image.jpg", b"image")
+    artifact = write(tmp_path / "cover.jpg", b"cover")
+    key = cache.fingerprint("cover", {}, [source])
+    dest = str(tmp_path / "run" / "cover.jpg")
+
+    assert not cache.fetch("cover", key, dest)
+    cache.store("cover", key, artifact, params={"title": "a"}, files=[source])
+    assert cache.fetch("cover", key, dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"cover"
+
+    # 产物是副本，阶段原地覆盖输出文件不会改坏缓存
+    write(dest, b"changed")
+    assert cache.fetch("cover", key, dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"cover"
+    assert cache.stats() == {"hits": 2, "misses": 1}
+
+
+def test_stage_cache_evicts_whole_entries(tmp_path):
+    cache = StageCache(str(tmp_path / "stages"), max_bytes=1000)
+    old = write(tmp_path / "old.mp4", b"x" * 600)
+    new = write(tmp_path / "new.mp4", b"x" * 600)
+
+    cache.store("video", "old", old)
+    meta = tmp_path / "stages" / "video" / "old" / "meta.json"
+    os.utime(meta, (time.time() - 60, time.time() - 60))
+    cache.store("video", "new", new)
+
+    assert os.listdir(tmp_path / "stages" / "video") == ["new"]
+    assert not cache.fetch("video", "old", str(tmp_path / "out.mp4"))
+    assert cache.fetch("video", "new", str(tmp_path / "out.mp4"))
+
+
+@pytest.fixture
+def fake_downloads(monkeypatch):
+    """用本地内容代替 download_video，记录每个 URL 的下载次数"""
+    contents = {}
+    calls = []
+
+    async def download_video(url, path, validators=None):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        with open(path, "wb") as f:
+            f.write(contents[url])
+        if validators is not None:
+            validators["etag"] = f'"{url}"'
+        return True
+
+    monkeypatch.setattr(download_cache, "download_video", download_video)
+    return contents, calls
+
+
+def test_download_cache_downloads_each_url_once(tmp_path, fake_downloads):
+    contents, calls = fake_downloads
+    contents["http://a"] = b"a" * 10
+    cache = DownloadCache(str(tmp_path / "cache"))
+    dests = [str(tmp_path / "tasks" / f"{i}.mp4") for i in range(3)]
+
+    async def run():
+        return await asyncio.gather(*(cache.fetch("http://a", dest) for dest in dests))
+
+    assert asyncio.run(run()) == [True, True, True]
+    assert calls == ["http://a"]
+    assert cache.stats() == {"hits": 2, "misses": 1, "referenced": 1}
+    assert cache.refs == {next(iter(cache.refs)): 3}
+    assert cache._url_locks == {}
+
+    for dest in dests:
+        os.remove(dest)
+        cache.release(dest)
+    assert cache.refs == {}
+
+
+def test_download_cache_keeps_referenced_blobs(tmp_path, fake_downloads):
+    contents, _ = fake_downloads
+    for url in ("http://a", "http://b", "http://c"):
+        contents[url] = url.encode() * 40
+    cache = DownloadCache(str(tmp_path / "cache"), max_bytes=500)
+    task_a = str(tmp_path / "tasks" / "a.mp4")
+
+    asyncio.run(cache.fetch("http://a", task_a))
+    blob_a = cache._blob_path(cache.urls["http://a"]["sha256"])
+    os.utime(blob_a, (time.time() - 60, time.time() - 60))
+
+    # 任务文件已删除但引用未释放，仍不能淘汰
+    os.remove(task_a)
+    asyncio.run(cache.fetch("http://b", str(tmp_path / "tasks" / "b.mp4")))
+    assert os.path.exists(blob_a)
+
+    cache.release(task_a)
+    asyncio.run(cache.fetch("http://c", str(tmp_path / "tasks" / "c.mp4")))
+    assert not os.path.exists(blob_a)
+    assert "http://a" not in cache.urls
+    assert set(cache.urls) == {"http://b", "http://c"}
@@ -0,0 +1,110 @@
+import wave
+
+import pytest
+
+from image.add_text import calculate_font_size, measure_text
+from image.fonts import FontRegistry
+from scripts.produce_with_gpt import ScriptStreamParser
+from voice.clone import concat_wav, split_sentences
+
+RESPONSE = '{"title": "早安", "script": "早上好！！今天也要加油哦。\\n\\"旅行者\\"，出发吧\\u0021"}'
+
+
+def parse(deltas):
+    parser = ScriptStreamParser()
+    sentences = []
+    for delta in deltas:
+        sentences.extend(parser.feed(delta))
+    return sentences + parser.close()
+
+
+def test_stream_parser_extracts_script_sentences():
+    assert parse([RESPONSE]) == ["早上好！！", "今天也要加油哦。", '"旅行者"，出发吧!']
+
+
+def test_stream_parser_handles_any_split():
+    # 逐字符送入时转义序列和 \uXXXX 会被切开，结果必须与整段送入一致
+    assert parse(RESPONSE) == parse([RESPONSE])
+
+
+def test_stream_parser_emits_sentences_before_the_end():
+    parser = ScriptStreamParser()
+    assert parser.feed('{"script": "第一句。第') == ["第一句。"]
+    assert parser.feed('二句') == []
+    assert parser.feed('。"}') == ["第二句。"]
+    assert parser.done
+    assert parser.close() == []
+
+
+def test_stream_parser_ignores_other_fields_and_missing_script():
+    assert parse(['{"title": "标题。", "other": "不是文案。"}']) == []
+
+
+def test_split_sentences_merges_short_sentences():
+    assert split_sentences("好。今天天气真不错呀！我们去散步吧。", min_chars=4) == [
+        "好。今天天气真不错呀！",
+        "我们去散步吧。",
+    ]
+    assert split_sentences("第一句话说完了。嗯。", min_chars=4) == ["第一句话说完了。嗯。"]
+    assert split_sentences("") == []
+
+
+def write_wav(path, frames, framerate=8000, sampwidth=2):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(sampwidth)
+        f.setframerate(framerate)
+        f.writeframes(b"\x01" * sampwidth * frames)
+    return str(path)
+
+
+def test_concat_wav_inserts_gaps(tmp_path):
+    segments = [write_wav(tmp_path / f"{i}.wav", 800) for i in range(3)]
+    output = concat_wav(segments, str(tmp_path / "out.wav"), gap=0.5)
+
+    with wave.open(output, "rb") as f:
+        assert f.getframerate() == 8000
+        assert f.getnframes() == 3 * 800 + 2 * 4000
+        data = f.readframes(f.getnframes())
+    assert data[1600:1600 + 8000] == b"\x00" * 8000
+
+
+def test_concat_wav_rejects_mismatched_segments(tmp_path):
+    segments = [write_wav(tmp_path / "a.wav", 10), write_wav(tmp_path / "b.wav", 10, framerate=16000)]
+    with pytest.raises(ValueError):
+        concat_wav(segments, str(tmp_path / "out.wav"))
+    with pytest.raises(ValueError):
+        concat_wav([], str(tmp_path / "out.wav"))
+    assert not (tmp_path / "out.wav").exists()
+
+
+@pytest.fixture(scope="module")
+def font(tmp_path_factory):
+    registry = FontRegistry(index_path=str(tmp_path_factory.mktemp("fonts") / "index.json"))
+    registry.load()
+    entry = registry.resolve(require_cjk=False)
+    if entry is None:
+        pytest.skip("系统中没有可用字体")
+    return entry.path, entry.index
+
+
+def text_width(font, size, text):
+    left, _, right, _ = measure_text(font[0], size, text, font[1])
+    return right - left
+
+
+def test_calculate_font_size_picks_largest_fitting_size(font):
+    text = "Hello World"
+    font_obj, width, _ = calculate_font_size(text, font[0], 300, font_index=font[1])
+
+    assert width <= 300
+    assert text_width(font, font_obj.size + 1, text) > 300
+
+
+def test_calculate_font_size_is_clamped(font):
+    font_obj, _, _ = calculate_font_size("Hi", font[0], 10_000, max_size=80, font_index=font[1])
+    assert font_obj.size == 80
+
+    font_obj, width, _ = calculate_font_size("Hello World" * 20, font[0], 50, font_index=font[1])
+    assert font_obj.size == 20
+    assert width > 50
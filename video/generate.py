@@ -1,38 +1,334 @@
 from moviepy import ImageClip, AudioFileClip, CompositeVideoClip
+import argparse
+import glob
 import json
+import math
+import os
+import subprocess
+import time
+import traceback
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Optional
 
-def generate_video(image_path, audio_path, output_path):
+from common.ffmpeg import get_ffmpeg_exe, parse_duration, parse_progress_time
+
+# MP4 可以直接封装、无需重新编码的音频格式
+COPYABLE_AUDIO_EXTENSIONS = (".aac", ".m4a", ".mp3")
+
+# 静态封面视频的帧率：画面不变，帧率只影响拖动进度条时的定位精度
+STILL_FPS = 1
+
+
+def _audio_args(audio_path):
+    """MP4 支持的压缩音频原样复制，其他格式（如 wav）编码为 AAC"""
+    lower = audio_path.lower()
+    if not lower.endswith(COPYABLE_AUDIO_EXTENSIONS):
+        return ["-c:a", "aac", "-b:a", "192k"]
+    args = ["-c:a", "copy"]
+    if lower.endswith(".aac"):
+        # ADTS 封装的 AAC 写入 MP4 前需要转换码流头
+        args += ["-bsf:a", "aac_adtstoasc"]
+    return args
+
+
+def _run_ffmpeg(args, output_path, description):
+    """运行 ffmpeg 写入临时文件，成功后原子替换到 output_path"""
+    tmp_path = f"{output_path}.part"
+    cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error"] + args + ["-f", "mp4", tmp_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg {description}失败: {result.stderr.strip()}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def probe_duration(path):
+    """读取媒体文件时长（秒）：WAV 直接读文件头，其他格式解析 ffmpeg -i 的输出"""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    result = subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    duration = parse_duration(result.stderr)
+    if duration is None:
+        raise RuntimeError(f"无法读取时长: {path}")
+    return duration
+
+
+def audio_duration(path):
+    """
+    读取音频的实际时长（秒）
+    
+    ffmpeg -i 对没有时长信息的格式（如 ADTS 封装的 AAC）只会按码率估算，
+    可变码率时误差很大，所以压缩音频完整解码一遍（-f null，不写输出），
+    以解码到的最后时间戳为准；WAV 直接读文件头。
+    """
+    if path.lower().endswith(".wav"):
+        return probe_duration(path)
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", path, "-map", "0:a:0", "-f", "null", "-"],
+        capture_output=True, text=True
+    )
+    duration = parse_progress_time(result.stderr)
+    if result.returncode != 0 or duration is None:
+        raise RuntimeError(f"无法读取时长: {path}")
+    return duration
+
+
+def mux_audio(video_path, audio_path, output_path):
+    """把音频原样封装进视频（两路流都不重新编码），以音频长度为准"""
+    return _run_ffmpeg([
+        "-i", video_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy",
+    ] + _audio_args(audio_path) + [
+        "-shortest",
+        "-movflags", "+faststart",
+    ], output_path, "封装")
+
+
+def render_still_video(image_path, audio_path, output_path, fps=STILL_FPS, threads=0):
+    """
+    直接用 ffmpeg 把单张静态图片和音频合成为视频
+    
+    图片只解码、缩放一次，再用 loop 滤镜重复这一帧，配合 -tune stillimage 和
+    很低的帧率，编码器几乎只需处理一个关键帧；音频能直接封装时不重新编码。
+    画面尺寸与图片一致（奇数边长向下取偶，yuv420p 的要求），帧数按
+    audio_duration 解码得到的实际音频时长计算。
+    
+    参数:
+        image_path: 图片文件路径
+        audio_path: 音频文件路径
+        output_path: 输出视频文件路径
+        fps: 输出帧率
+        threads: 编码线程数，0 表示由 ffmpeg 自行决定
+    """
+    frames = max(1, math.ceil(audio_duration(audio_path) * fps))
+    return _run_ffmpeg([
+        "-framerate", str(fps), "-i", image_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-vf", (
+            "scale=trunc(iw/2)*2:trunc(ih/2)*2,setsar=1,format=yuv420p,"
+            f"loop=loop={frames - 1}:size=1,setpts=N/{fps}/TB"
+        ),
+        "-c:v", "libx264", "-tune", "stillimage", "-preset", "veryfast",
+        "-r", str(fps), "-g", str(fps * 10),
+    ] + _audio_args(audio_path) + [
+        "-threads", str(threads),
+        "-shortest",
+        "-movflags", "+faststart",
+    ], output_path, "合成视频")
+
+
+def generate_video(image_path, audio_path, output_path, engine="ffmpeg", threads=0):
     """
     将图片和音频合成为视频
     
+    默认走 render_still_video 的 ffmpeg 快速路径；engine="moviepy" 时使用
+    moviepy 逐帧渲染，此时音频为 AAC/MP3 等 MP4 支持的格式，只渲染画面，
+    再把音频原样封装进去，省去一次音频解码和重新编码。
+    
     参数:
         image_path: 图片文件路径
         audio_path: 音频文件路径
         output_path: 输出视频文件路径
+        engine: "ffmpeg" 或 "moviepy"
+        threads: ffmpeg 编码线程数，0 表示自动
     """
+    if engine == "ffmpeg":
+        return render_still_video(image_path, audio_path, output_path, threads=threads)
+
     # 加载音频文件
     audio = AudioFileClip(audio_path)
     
+    if audio_path.lower().endswith(COPYABLE_AUDIO_EXTENSIONS):
+        # moviepy 给出的压缩音频时长可能只是估算值，画面按解码得到的实际时长
+        # 多留一秒，再由 -shortest 按音频截断
+        audio.close()
+        duration = audio_duration(audio_path) + 1
+        image = ImageClip(image_path).with_duration(duration)
+        video_only = f"{output_path}.video.mp4"
+        try:
+            image.write_videofile(video_only, fps=24, audio=False)
+            mux_audio(video_only, audio_path, output_path)
+        finally:
+            image.close()
+            if os.path.exists(video_only):
+                os.remove(video_only)
+        return
+    
     # 创建图片剪辑，持续时间与音频相同
     image = ImageClip(image_path).with_duration(audio.duration)
     
     # 将音频添加到图片中
     video = image.with_audio(audio)
     
-    # 生成视频文件
-    video.write_videofile(output_path, fps=24)
+    # 生成视频文件（临时音频放在输出目录，避免多个任务在当前目录互相覆盖）
+    video.write_videofile(
+        output_path,
+        fps=24,
+        temp_audiofile_path=os.path.dirname(os.path.abspath(output_path)),
+    )
     
     # 清理资源
     audio.close()
     video.close()
 
+@dataclass
+class RenderJob:
+    """批量合成中的一个视频任务"""
+    image_path: str
+    audio_path: str
+    output_path: str
+
+
+@dataclass
+class RenderResult:
+    job: RenderJob
+    encode_time: float
+    duration: float = 0.0  # 成片时长（秒）
+    threads: int = 0
+    error: Optional[str] = None
+
+    @property
+    def realtime_factor(self) -> float:
+        """成片时长 / 编码耗时，越大越快"""
+        return self.duration / self.encode_time if self.encode_time else 0.0
+
+
+def plan_threads(job_count, thread_budget=None, parallel=None):
+    """
+    把全局线程预算分给同时运行的编码器，返回 (并行数, 每个编码器的线程数)
+    
+    静态画面编码的并行度有限，默认每个核跑一个编码器、每个编码器一个线程；
+    指定 parallel 时按预算平分，保证 并行数 × 线程数 不超过预算。
+    """
+    budget = max(1, thread_budget or os.cpu_count() or 1)
+    parallel = max(1, min(parallel or budget, budget, job_count))
+    return parallel, max(1, budget // parallel)
+
+
+def _render_job(job, threads):
+    """在工作线程中驱动一个 ffmpeg 进程，异常转为错误信息返回"""
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(job.output_path) or ".", exist_ok=True)
+        render_still_video(job.image_path, job.audio_path, job.output_path, threads=threads)
+        encode_time = time.perf_counter() - start
+        return RenderResult(job, encode_time, probe_duration(job.output_path), threads)
+    except Exception:
+        return RenderResult(job, time.perf_counter() - start, threads=threads, error=traceback.format_exc())
+
+
+def render_videos(jobs, thread_budget=None, parallel=None):
+    """
+    批量合成视频，所有编码器共享一个线程预算
+    
+    编码工作在 ffmpeg 子进程中完成，这里用线程池调度即可；每个 ffmpeg 通过
+    -threads 限制自己的线程数，整批任务占用的核数不会超过预算。
+    
+    Args:
+        jobs (List[RenderJob]): 视频任务列表
+        thread_budget (int): 全局线程预算，默认为 CPU 核数
+        parallel (int): 同时运行的编码器数量，默认见 plan_threads
+    
+    Returns:
+        List[RenderResult]: 与 jobs 顺序一致的结果，包含编码耗时、成片时长和错误信息
+    """
+    if not jobs:
+        return []
+    parallel, threads = plan_threads(len(jobs), thread_budget, parallel)
+    print(f"共 {len(jobs)} 个视频，{parallel} 个编码器并行，每个 {threads} 线程")
+    results: List[Optional[RenderResult]] = [None] * len(jobs)
+    
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(_render_job, job, threads): index for index, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[futures[future]] = result
+            if result.error:
+                print(f"[{done}/{len(jobs)}] 失败 {result.job.output_path} ({result.encode_time:.2f}s)")
+            else:
+                print(f"[{done}/{len(jobs)}] 完成 {result.job.output_path} "
+                      f"时长 {result.duration:.1f}s，编码 {result.encode_time:.2f}s，"
+                      f"{result.realtime_factor:.1f}x 实时")
+    
+    return results
+
+
+def find_voice_audio(directory, names=("voice.aac", "voice.m4a", "voice.ogg", "voice.wav")):
+    """
+    返回目录中最新生成的语音文件，没有时返回 None
+    
+    同一目录可能残留以前用其他 --media-type 生成的音频，按修改时间取最新的，
+    避免把旧的 voice.aac 合成进本次的视频。
+    """
+    paths = [os.path.join(directory, name) for name in names]
+    paths = [path for path in paths if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime, default=None)
+
+
+def _load_jobs(args):
+    """根据命令行参数构建批量任务"""
+    if args.jobs:
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            return [RenderJob(**item) for item in json.load(f)]
+    
+    # 流水线的工作目录：每个角色一个子目录，内含 image.jpg 和 voice.wav / voice.aac
+    jobs = []
+    for workspace in sorted(glob.glob(os.path.join(args.runs, "*"))):
+        image_path = os.path.join(workspace, "image.jpg")
+        audio_path = find_voice_audio(workspace)
+        if os.path.exists(image_path) and audio_path:
+            jobs.append(RenderJob(image_path, audio_path, os.path.join(workspace, "video.mp4")))
+    return jobs
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将封面和语音合成为视频')
+    parser.add_argument('--engine', choices=["ffmpeg", "moviepy"], default="ffmpeg",
+                        help='ffmpeg 为静态图片快速路径，moviepy 为逐帧渲染')
+    parser.add_argument('--audio', type=str, default=None,
+                        help='语音文件，默认取 output/ 下最新的 voice.*（aac / m4a / ogg / wav）')
+    parser.add_argument('--jobs', type=str, default=None,
+                        help='批量任务 JSON 文件，内容为 [{image_path, audio_path, output_path}, ...]')
+    parser.add_argument('--runs', type=str, default=None,
+                        help='批量合成流水线工作目录（如 output/runs）下的所有角色')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='批量合成的全局线程预算，默认为 CPU 核数')
+    parser.add_argument('--parallel', type=int, default=None,
+                        help='同时运行的编码器数量')
+    args = parser.parse_args()
+    
+    if args.jobs or args.runs:
+        jobs = _load_jobs(args)
+        start = time.perf_counter()
+        results = render_videos(jobs, args.threads, args.parallel)
+        elapsed = time.perf_counter() - start
+        
+        failed = [r for r in results if r.error]
+        for result in failed:
+            print(f"合成失败: {result.job.output_path}\n{result.error}")
+        encoded = sum(r.encode_time for r in results)
+        footage = sum(r.duration for r in results)
+        print(f"共 {len(results)} 个，失败 {len(failed)} 个，成片 {footage:.1f}s，"
+              f"累计编码 {encoded:.1f}s，实际耗时 {elapsed:.1f}s，"
+              f"整体 {footage / elapsed if elapsed else 0:.1f}x 实时")
+        raise SystemExit(1 if failed else 0)
+
     # 读取脚本配置
     with open("output/script.json", "r", encoding="utf-8") as f:
         script = json.load(f)
     
     image_path = script["cover_image"]    # 从script.json中读取封面图片路径
-    audio_path = "output/voice.wav"    # 替换为你的音频路径
+    audio_path = args.audio or find_voice_audio("output")
+    if not audio_path:
+        parser.error("output/ 下没有语音文件，请先运行 python -m voice.clone 或通过 --audio 指定")
     output_path = "output/video.mp4"         # 输出视频路径
     
-    generate_video(image_path, audio_path, output_path)
+    generate_video(image_path, audio_path, output_path, engine=args.engine)
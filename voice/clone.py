@@ -1,23 +1,227 @@
 import sys
+import argparse
+import asyncio
+import glob
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
-from typing import Optional
+import random
+import shutil
+import threading
+import time
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, List, Optional, Sequence
 import locale
 from dotenv import load_dotenv
 
+from common.cache import DirectoryCache
+
 # 设置本地化编码
 locale.getpreferredencoding = lambda: 'UTF-8'
 
 # 设置命令行输出编码为UTF-8
 sys.stdout.reconfigure(encoding='utf-8')  # Python 3.7+
 
+# 按顺序尝试的模型地区，角色的参考音频只存在于其中一个模型中
+MODEL_REGIONS = ["稻妻", "璃月", "蒙德", "降临者", "须弥", "纳塔", "枫丹"]
+
+# 持久化的 角色 → 模型 索引
+SPEAKER_INDEX_PATH = "output/cache/voice_models.json"
+
+# 可以重试的 HTTP 状态码（服务端过载或临时故障）
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 角色不在所选模型中时接口返回的信息，状态码不固定（200、4xx 甚至 5xx 都见过）
+REFERENCE_MISSING_MSG = "参考音频不存在"
+
+# 接口支持的音频格式。wav 体积大但可以在本地分句拼接；aac 可以直接封装进
+# MP4 而无需重新编码，体积只有 wav 的几分之一
+MEDIA_TYPES = ("wav", "aac", "ogg")
+
+# 客户端分句使用的句末标点
+SENTENCE_ENDINGS = "。！？!?；;…~～\n"
+
+# 合成结果缓存目录
+AUDIO_CACHE_DIR = "output/cache/tts"
+
+# 分段之间的静音时长（秒），与服务端 fragment_interval 保持一致
+FRAGMENT_INTERVAL = 0.3
+
+
+def concat_wav(segment_paths: List[str], output_path: str, gap: float = FRAGMENT_INTERVAL) -> str:
+    """按顺序拼接多个 WAV 文件，段与段之间插入 gap 秒静音
+    
+    逐块读写帧数据，不会把所有分段同时读入内存。各分段的声道数、位深和
+    采样率必须一致。
+    """
+    if not segment_paths:
+        raise ValueError("没有可拼接的音频分段")
+
+    with wave.open(segment_paths[0], "rb") as first:
+        params = first.getparams()
+    silence_byte = b"\x80" if params.sampwidth == 1 else b"\x00"
+    silence = silence_byte * (int(params.framerate * gap) * params.nchannels * params.sampwidth)
+
+    tmp_path = f"{output_path}.tmp"
+    with wave.open(tmp_path, "wb") as out:
+        out.setnchannels(params.nchannels)
+        out.setsampwidth(params.sampwidth)
+        out.setframerate(params.framerate)
+        for index, path in enumerate(segment_paths):
+            with wave.open(path, "rb") as segment:
+                if (segment.getnchannels(), segment.getsampwidth(), segment.getframerate()) != \
+                        (params.nchannels, params.sampwidth, params.framerate):
+                    raise ValueError(f"音频格式不一致: {path}")
+                if index > 0:
+                    out.writeframes(silence)
+                while True:
+                    frames = segment.readframes(65536)
+                    if not frames:
+                        break
+                    out.writeframes(frames)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def split_sentences(text: str, min_chars: int = 8) -> List[str]:
+    """按句末标点切分文本，过短的句子并入下一句，避免产生大量很短的请求"""
+    sentences = []
+    current = ""
+    pending_end = False
+    for ch in text:
+        if pending_end and ch not in SENTENCE_ENDINGS:
+            if len(current.strip()) >= min_chars:
+                sentences.append(current.strip())
+                current = ""
+            pending_end = False
+        current += ch
+        pending_end = pending_end or ch in SENTENCE_ENDINGS
+    if current.strip():
+        if sentences and len(current.strip()) < min_chars:
+            sentences[-1] += current.strip()
+        else:
+            sentences.append(current.strip())
+    return sentences
+
+
+@dataclass
+class SynthesisJob:
+    """批量合成中的一条语音"""
+    text: str
+    speaker_name: str
+    output_path: str
+    emotion: str = "随机"
+    speed_factor: float = 1.0
+    media_type: str = "wav"
+
+
+@dataclass
+class SynthesisResult:
+    index: int
+    job: SynthesisJob
+    duration: float
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class VoiceAPIError(Exception):
+    """语音合成接口返回的错误"""
+
+
+class TransientVoiceAPIError(VoiceAPIError):
+    """可重试的临时错误：5xx、429、连接中断、超时"""
+
+
+class ReferenceAudioNotFound(VoiceAPIError):
+    """所选模型中不存在该角色的参考音频，属于永久错误，不重试"""
+
+    def __init__(self, message: str = REFERENCE_MISSING_MSG):
+        super().__init__(message)
+
+
+class AudioCache(DirectoryCache):
+    """合成音频的磁盘缓存
+    
+    以请求参数（去掉 access_token）的 sha256 为键，每条音频保存为
+    <cache_dir>/<sha256>.<media_type>。总大小超限时，按最近访问时间淘汰
+    最旧的条目（见 DirectoryCache）。
+    """
+
+    def __init__(self, cache_dir: str = AUDIO_CACHE_DIR, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        """初始化缓存
+        
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        super().__init__(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        effective = {k: v for k, v in payload.items() if k != "access_token"}
+        data = json.dumps(effective, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, media_type: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{media_type}")
+
+    def get(self, key: str, media_type: str, output_path: str) -> bool:
+        """命中时把音频复制到 output_path 并返回 True"""
+        path = self._path(key, media_type)
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            tmp_path = self._tmp_path(output_path)
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, output_path)
+            self.touch(path)
+        except FileNotFoundError:
+            self.record(hit=False)
+            return False
+
+        self.record(hit=True)
+        return True
+
+    def put(self, key: str, media_type: str, src: str):
+        """把已下载的音频写入缓存并按需淘汰旧条目"""
+        path = self._path(key, media_type)
+        tmp_path = self._tmp_path(path)
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+
+
 class VoiceCloner:
-    def __init__(self):
+    def __init__(
+        self,
+        index_path: Optional[str] = SPEAKER_INDEX_PATH,
+        connect_timeout: float = 10,
+        read_timeout: float = 180,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        pool_size: int = 16,
+        audio_cache: Optional[AudioCache] = None
+    ):
         """初始化 VoiceCloner 类。
         
         从 .env 文件中获取 API access token 和 URL。
         如果缺少配置，将抛出 ValueError 异常。
+        
+        Args:
+            index_path: 角色 → 模型 索引文件，为 None 时不持久化
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应数据的超时时间（秒），合成长文本较慢
+            max_retries: 临时错误的最大重试次数
+            backoff: 重试的基础等待时间（秒），按指数增长并加随机抖动
+            pool_size: 连接池大小，应不小于并发请求数
+            audio_cache: 可选的音频缓存，参数相同的请求直接取缓存，不访问接口
         """
         # 加载 .env 文件
         load_dotenv()
@@ -27,7 +231,97 @@ class VoiceCloner:
         
         if not self.access_token or not self.api_url:
             raise ValueError("需要在 .env 文件中提供 VOICE_API_TOKEN 和 VOICE_API_URL")
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.audio_cache = audio_cache
+
+        # 共享的 keep-alive 连接池，避免每次请求重新握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # 已确认的 角色 → 模型 对应关系，已知角色只需一次请求
+        self.index_path = index_path
+        self.speaker_models: Dict[str, str] = {}
+        self._index_lock = threading.Lock()
+        if index_path and os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self.speaker_models = json.load(f)
+            except json.JSONDecodeError:
+                print(f"警告: 模型索引 {index_path} 已损坏，将重新建立")
+
+    def _remember_model(self, speaker_name: str, model_name: Optional[str]):
+        """更新并保存 角色 → 模型 索引，model_name 为 None 表示删除"""
+        with self._index_lock:
+            if model_name is None:
+                if self.speaker_models.pop(speaker_name, None) is None:
+                    return
+            elif self.speaker_models.get(speaker_name) == model_name:
+                return
+            else:
+                self.speaker_models[speaker_name] = model_name
+
+            if not self.index_path:
+                return
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.speaker_models, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.index_path)
         
+    def _with_retry(self, description: str, func, *args, **kwargs):
+        """执行 func，遇到临时错误时按带抖动的指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, TransientVoiceAPIError) as e:
+                if attempt == self.max_retries:
+                    raise TransientVoiceAPIError(f"{description}失败，已重试 {attempt} 次: {e}") from e
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"{description}遇到临时错误 ({e})，{delay:.1f}s 后重试")
+                time.sleep(delay)
+
+    @staticmethod
+    def _reference_missing(response: requests.Response) -> bool:
+        """响应内容中是否带有"参考音频不存在"，JSON 中的字符串可能经过转义，先解析再查找"""
+        try:
+            body = json.dumps(response.json(), ensure_ascii=False)
+        except ValueError:
+            body = response.text
+        return REFERENCE_MISSING_MSG in body
+
+    def _post(self, payload: dict) -> requests.Response:
+        response = self.session.post(
+            self.api_url,
+            json=payload,
+            headers={"content-type": "application/json"},
+            timeout=self.timeout
+        )
+        # 先看响应内容再按状态码分类：参考音频不存在是永久错误，不能当作 5xx 重试
+        if self._reference_missing(response):
+            raise ReferenceAudioNotFound()
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientVoiceAPIError(f"HTTP {response.status_code}")
+        return response
+
+    def _download(self, audio_url: str, output_path: str, chunk_size: int = 64 * 1024) -> str:
+        """分块流式下载音频到临时文件，完成后原子替换到 output_path"""
+        tmp_path = f"{output_path}.part"
+        with self.session.get(audio_url, stream=True, timeout=self.timeout) as response:
+            if response.status_code in TRANSIENT_STATUS_CODES:
+                raise TransientVoiceAPIError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        os.replace(tmp_path, output_path)
+        return output_path
+
     def clone_voice(
         self,
         text: str,
@@ -36,7 +330,8 @@ class VoiceCloner:
         emotion: str = "随机",
         text_language: str = "中文",
         speed_factor: float = 1.0,
-        output_path: Optional[str] = None
+        output_path: Optional[str] = None,
+        media_type: str = "wav"
     ) -> str:
         """克隆语音
         
@@ -47,10 +342,14 @@ class VoiceCloner:
             text_language: 文本语言
             speed_factor: 语速  
             output_path: 输出音频文件路径
+            media_type: 音频格式，见 MEDIA_TYPES
             
         Returns:
             str: 音频文件路径
         """
+        if media_type not in MEDIA_TYPES:
+            raise ValueError(f"不支持的音频格式: {media_type}")
+
         # 构建请求参数
         payload = {
             "access_token": self.access_token,
@@ -68,23 +367,27 @@ class VoiceCloner:
             "batch_threshold": 0.75,
             "split_bucket": True,
             "speed_facter": speed_factor,
-            "fragment_interval": 0.3,
-            "media_type": "wav",
+            "fragment_interval": FRAGMENT_INTERVAL,
+            "media_type": media_type,
             "parallel_infer": True,
             "repetition_penalty": 1.35,
             "seed": -1
         }
 
+        # 只有落盘的请求才走缓存，返回 URL 的调用（如探测）总是访问接口
+        cache_key = None
+        if output_path and self.audio_cache:
+            cache_key = self.audio_cache.make_key(payload)
+            if self.audio_cache.get(cache_key, payload["media_type"], output_path):
+                print(f"命中音频缓存: {output_path}")
+                return output_path
+
         try:
             # 添加中文调试信息
             print(f"正在请求API: {self.api_url}")
             print(f"请求参数: {json.dumps(payload, ensure_ascii=False, indent=2)}")
             
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers={"content-type": "application/json"}
-            )
+            response = self._with_retry("请求语音合成接口", self._post, payload)
             
             # Mac系统下的处理方式
             try:
@@ -100,26 +403,24 @@ class VoiceCloner:
             if response.status_code != 200:
                 error_msg = response_text
                 print(f"错误信息: {error_msg}")
-                raise Exception(error_msg)
-                
-            response.raise_for_status()
+                raise VoiceAPIError(error_msg)
             
+            
+            # 参考音频不存在（不论状态码）已在 _post 中抛出 ReferenceAudioNotFound
             result = response.json()
-
-            if result.get("msg") == "参考音频不存在":
-                raise Exception(f"参考音频不存在")
             
             if not result.get("audio_url"):
-                raise Exception(f"语音合成失败: {result.get('message')}")
+                raise VoiceAPIError(f"语音合成失败: {result.get('message')}")
                 
             # 下载音频文件
             audio_url = result["audio_url"]
             if output_path:
-                audio_response = requests.get(audio_url)
-                audio_response.raise_for_status()
-                
-                with open(output_path, "wb") as f:
-                    f.write(audio_response.content)
+                self._with_retry("下载音频", self._download, audio_url, output_path)
+                if cache_key:
+                    try:
+                        self.audio_cache.put(cache_key, payload["media_type"], output_path)
+                    except OSError as e:
+                        print(f"写入音频缓存失败: {e}")
                 return output_path
             
             return audio_url
@@ -128,9 +429,339 @@ class VoiceCloner:
             print(f"语音克隆失败: {str(e)}")
             raise
 
+    def clone_voice_by_speaker(
+        self,
+        text: str,
+        speaker_name: str,
+        output_path: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """根据角色自动选择模型合成语音
+        
+        先查 角色 → 模型 索引，已知角色只发一次请求；未知角色（或索引已失效）
+        依次尝试各地区模型，成功后写入索引。
+        
+        Args:
+            text: 要合成的文本
+            speaker_name: 说话人角色
+            output_path: 输出音频文件路径
+            **kwargs: 透传给 clone_voice 的其他参数
+            
+        Returns:
+            str: 音频文件路径
+        """
+        model_names = [f"【原神】{region}" for region in MODEL_REGIONS]
+        known = self.speaker_models.get(speaker_name)
+        if known:
+            if known in model_names:
+                model_names.remove(known)
+            model_names.insert(0, known)
+
+        for model_name in model_names:
+            try:
+                path = self.clone_voice(
+                    text=text,
+                    model_name=model_name,
+                    speaker_name=speaker_name,
+                    output_path=output_path,
+                    **kwargs
+                )
+                self._remember_model(speaker_name, model_name)
+                return path
+            except ReferenceAudioNotFound:
+                print(f"模型 {model_name} 不存在该角色的参考音频，尝试下一个模型")
+                if model_name == known:
+                    self._remember_model(speaker_name, None)
+                continue
+            except Exception as e:
+                print(f"发生错误: {str(e)}")
+                raise  # 对于其他错误，向上传播异常
+        raise ReferenceAudioNotFound(f"所有模型都不存在 {speaker_name} 的参考音频")
+
+    def clone_voice_parallel(
+        self,
+        text: str,
+        speaker_name: str,
+        output_path: str,
+        max_workers: int = 4,
+        **kwargs
+    ) -> str:
+        """在客户端按标点分句，并发合成各句后拼接成一个 WAV 文件
+        
+        服务端按标点切分后是串行合成的，长文案的耗时随句数线性增长；分句
+        并发后总耗时接近最慢的一句。句与句之间插入 FRAGMENT_INTERVAL 静音，
+        与服务端切分的效果一致。
+        
+        Args:
+            text: 要合成的文本
+            speaker_name: 说话人角色
+            output_path: 输出音频文件路径
+            max_workers: 同时合成的句子数
+            **kwargs: 透传给 clone_voice 的其他参数
+            
+        Returns:
+            str: 音频文件路径
+        """
+        sentences = split_sentences(text)
+        if kwargs.get("media_type", "wav") != "wav":
+            # 压缩格式无法在本地无损拼接，交给服务端切分
+            print("非 wav 格式不支持本地分句，改为整段合成")
+            sentences = sentences[:1]
+        if len(sentences) <= 1:
+            return self.clone_voice_by_speaker(text, speaker_name, output_path, **kwargs)
+
+        # 未知角色先并行探测所在模型，避免每一句都依次尝试各个地区
+        if speaker_name not in self.speaker_models:
+            self.probe_speaker(speaker_name)
+
+        synthesizer = StreamingSynthesizer(
+            self, speaker_name, output_path, max_workers=max_workers, **kwargs
+        )
+        try:
+            for sentence in sentences:
+                synthesizer.submit(sentence)
+        except Exception:
+            synthesizer.close()
+            raise
+        return synthesizer.finish()
+
+    def probe_speaker(self, speaker_name: str, text: str = "你好。") -> Optional[str]:
+        """并行向所有地区模型发送一条短文本，找出该角色所在的模型并写入索引"""
+        model_names = [f"【原神】{region}" for region in MODEL_REGIONS]
+        with ThreadPoolExecutor(max_workers=len(model_names)) as executor:
+            futures = {
+                executor.submit(
+                    self.clone_voice, text=text, model_name=model_name, speaker_name=speaker_name
+                ): model_name
+                for model_name in model_names
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except ReferenceAudioNotFound:
+                    continue
+                except Exception as e:
+                    print(f"探测 {speaker_name} @ {futures[future]} 失败: {str(e)}")
+                    continue
+                self._remember_model(speaker_name, futures[future])
+                return futures[future]
+        print(f"未找到 {speaker_name} 的模型")
+        return None
+
+    def probe_speakers(
+        self,
+        speaker_names: Sequence[str],
+        max_workers: int = 4,
+        refresh: bool = False
+    ) -> Dict[str, Optional[str]]:
+        """批量探测多个角色的模型，默认跳过索引中已有的角色"""
+        pending = [
+            name for name in dict.fromkeys(speaker_names)
+            if refresh or name not in self.speaker_models
+        ]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            models = dict(zip(pending, executor.map(self.probe_speaker, pending)))
+        return {name: models.get(name, self.speaker_models.get(name)) for name in speaker_names}
+
+
+    async def clone_many(
+        self,
+        jobs: Sequence[SynthesisJob],
+        concurrency: int = 4,
+        manifest_path: Optional[str] = None
+    ) -> AsyncIterator[SynthesisResult]:
+        """并发合成多条语音，按完成顺序逐条返回结果
+        
+        同时进行的请求数不超过 concurrency（连接池大小 pool_size 应不小于它）。
+        全部结束（或中途停止迭代）后，如指定了 manifest_path，会写入包含
+        每条语音输出路径、耗时和错误信息的清单。
+        
+        Args:
+            jobs: 合成任务列表
+            concurrency: 最大并发请求数
+            manifest_path: 清单文件路径
+        
+        Yields:
+            SynthesisResult: 单条语音的合成结果
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        started = time.perf_counter()
+        results: List[SynthesisResult] = []
+
+        def synthesize(index: int, job: SynthesisJob) -> SynthesisResult:
+            start = time.perf_counter()
+            try:
+                os.makedirs(os.path.dirname(job.output_path) or ".", exist_ok=True)
+                path = self.clone_voice_by_speaker(
+                    text=job.text,
+                    speaker_name=job.speaker_name,
+                    output_path=job.output_path,
+                    emotion=job.emotion,
+                    speed_factor=job.speed_factor,
+                    media_type=job.media_type
+                )
+                return SynthesisResult(index, job, time.perf_counter() - start, path=path)
+            except Exception as e:
+                return SynthesisResult(index, job, time.perf_counter() - start, error=str(e))
+
+        futures = [
+            loop.run_in_executor(executor, synthesize, index, job)
+            for index, job in enumerate(jobs)
+        ]
+        try:
+            for future in asyncio.as_completed(futures):
+                result = await future
+                results.append(result)
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if manifest_path:
+                self._write_manifest(manifest_path, results, time.perf_counter() - started)
+
+    @staticmethod
+    def _write_manifest(manifest_path: str, results: List[SynthesisResult], elapsed: float):
+        manifest = {
+            "elapsed": round(elapsed, 3),
+            "total": len(results),
+            "failed": sum(not result.ok for result in results),
+            "items": [
+                {
+                    "index": result.index,
+                    **asdict(result.job),
+                    "path": result.path,
+                    "duration": round(result.duration, 3),
+                    "error": result.error,
+                }
+                for result in sorted(results, key=lambda r: r.index)
+            ],
+        }
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        print(f"清单已写入 {manifest_path}")
+
+
+class StreamingSynthesizer:
+    """边接收句子边合成语音，结束时按顺序拼接成一个 WAV 文件
+    
+    配合 GPT 流式输出使用：每当文案中完成一句话就调用 submit()，
+    语音合成与文案生成同时进行，最后调用 finish() 得到完整音频。
+    """
+
+    def __init__(
+        self,
+        cloner: VoiceCloner,
+        speaker_name: str,
+        output_path: str,
+        max_workers: int = 2,
+        **kwargs
+    ):
+        """初始化
+        
+        Args:
+            cloner: VoiceCloner 实例
+            speaker_name: 说话人角色
+            output_path: 拼接后的音频文件路径
+            max_workers: 同时合成的句子数
+            **kwargs: 透传给 clone_voice 的其他参数
+        """
+        if kwargs.get("media_type", "wav") != "wav":
+            raise ValueError("分句合成只支持 wav 格式")
+        self.cloner = cloner
+        self.speaker_name = speaker_name
+        self.output_path = output_path
+        self.kwargs = kwargs
+        self.parts_dir = f"{output_path}.parts"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: List[Future] = []
+        os.makedirs(self.parts_dir, exist_ok=True)
+
+    def _synthesize(self, index: int, sentence: str) -> str:
+        if index > 0 and self.speaker_name not in self.cloner.speaker_models:
+            # 等第一句确定角色所在的模型后再开始，避免并发重复探测
+            try:
+                self._futures[0].result()
+            except Exception:
+                pass
+        path = os.path.join(self.parts_dir, f"{index:03d}.wav")
+        return self.cloner.clone_voice_by_speaker(
+            text=sentence,
+            speaker_name=self.speaker_name,
+            output_path=path,
+            **self.kwargs
+        )
+
+    def submit(self, sentence: str):
+        print(f"开始合成第 {len(self._futures) + 1} 句: {sentence}")
+        self._futures.append(
+            self._executor.submit(self._synthesize, len(self._futures), sentence)
+        )
+
+    def finish(self) -> str:
+        """等待所有句子合成完毕并拼接，返回音频文件路径"""
+        try:
+            paths = [future.result() for future in self._futures]
+            return concat_wav(paths, self.output_path)
+        finally:
+            self.close()
+
+    def close(self):
+        """取消未开始的合成并清理分段文件"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='克隆角色语音')
+    parser.add_argument('--probe', nargs='*', default=None,
+                        help='探测角色所在的模型并写入索引，不指定角色时探测 resource/ 下所有角色')
+    parser.add_argument('--refresh', action='store_true',
+                        help='探测时忽略索引中已有的记录')
+    parser.add_argument('--jobs', type=str, default=None,
+                        help='批量合成任务 JSON 文件，内容为 [{text, speaker_name, output_path, emotion, speed_factor, media_type}, ...]')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='批量合成时的最大并发请求数')
+    parser.add_argument('--manifest', type=str, default="output/voices/manifest.json",
+                        help='批量合成结果清单路径')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用音频缓存，总是请求接口')
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='大于 1 时在本地分句，并发合成后拼接（仅 wav）')
+    parser.add_argument('--media-type', choices=MEDIA_TYPES, default="wav",
+                        help='音频格式，aac 可直接封装进视频')
+    args = parser.parse_args()
+
     # 示例使用
-    cloner = VoiceCloner()
+    cloner = VoiceCloner(
+        pool_size=max(16, args.concurrency),
+        audio_cache=None if args.no_cache else AudioCache()
+    )
+
+    if args.jobs:
+        with open(args.jobs, "r", encoding="utf-8") as f:
+            jobs = [SynthesisJob(**item) for item in json.load(f)]
+
+        async def run_jobs():
+            failed = 0
+            async for result in cloner.clone_many(jobs, args.concurrency, args.manifest):
+                status = "完成" if result.ok else f"失败: {result.error}"
+                print(f"[{result.index}] {result.job.output_path} {status} ({result.duration:.1f}s)")
+                failed += not result.ok
+            return failed
+
+        sys.exit(1 if asyncio.run(run_jobs()) else 0)
+
+    if args.probe is not None:
+        speakers = args.probe
+        if not speakers:
+            for path in sorted(glob.glob("resource/*.json")):
+                with open(path, "r", encoding="utf-8") as f:
+                    speakers.append(json.load(f)["name"])
+        for speaker, model in cloner.probe_speakers(speakers, refresh=args.refresh).items():
+            print(f"{speaker}: {model or '未找到'}")
+        sys.exit(0)
     
     # 从JSON文件读取生成的内容
     with open("output/script.json", "r", encoding="utf-8") as f:
@@ -138,26 +769,24 @@ if __name__ == "__main__":
 
     speaker_name = f"{content['name']}"
     text = content["content"]["script"]
-    output_path = "output/voice.wav"
+    output_path = f"output/voice.{args.media_type}"
     
     print("开始克隆语音")
     # 克隆语音
 
-    for model_name in ["稻妻", "璃月", "蒙德", "降临者", "须弥", "纳塔", "枫丹"]:
-        model_name = f"【原神】{model_name}"
-        try:
-            audio_path = cloner.clone_voice(
-                text=text,
-                model_name=model_name,
-                speaker_name=speaker_name,
-                output_path=output_path
-            )
-            print(f"语音文件已保存至: {audio_path}")
-            break  # 成功生成语音后退出循环
-        except Exception as e:
-            if "参考音频不存在" in str(e):
-                print(f"模型 {model_name} 不存在该角色的参考音频，尝试下一个模型")
-                continue
-            else:
-                print(f"发生错误: {str(e)}")
-                raise  # 对于其他错误，向上传播异常
+    if args.parallel > 1:
+        audio_path = cloner.clone_voice_parallel(
+            text=text,
+            speaker_name=speaker_name,
+            output_path=output_path,
+            max_workers=args.parallel,
+            media_type=args.media_type
+        )
+    else:
+        audio_path = cloner.clone_voice_by_speaker(
+            text=text,
+            speaker_name=speaker_name,
+            output_path=output_path,
+            media_type=args.media_type
+        )
+    print(f"语音文件已保存至: {audio_path}")
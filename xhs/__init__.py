@@ -1,6 +1,8 @@
 """XHS (Xiaohongshu) publishing module."""
 
+from .download_cache import DownloadCache
 from .publish import publish_xhs_content, xiaohongshu_login, publish_xiaohongshu
+from .transcode import UploadProfile, prepare_upload
 from .utils import download_video, parse_tags
 
 __all__ = [
@@ -8,5 +10,8 @@ __all__ = [
     'xiaohongshu_login', 
     'publish_xiaohongshu',
     'download_video',
-    'parse_tags'
+    'parse_tags',
+    'UploadProfile',
+    'prepare_upload',
+    'DownloadCache'
 ]
\ No newline at end of file
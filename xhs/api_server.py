@@ -8,8 +8,10 @@ from pydantic import BaseModel, HttpUrl, field_validator
 import uvicorn
 from dataclasses import dataclass
 
+from xhs.download_cache import DownloadCache
 from xhs.publish import publish_xhs_content
-from xhs.utils import download_video, parse_tags
+from xhs.transcode import UploadProfile
+from xhs.utils import close_client, parse_tags
 
 
 # Publishing task data structure
@@ -19,12 +21,16 @@ class PublishTask:
     publish_time: str
     video_path: str
     task_id: str
+    transcode: bool = False
 
 
 # Global queue and worker
 publish_queue = asyncio.Queue()
 worker_task = None
 
+# Repeated video_url submissions are served from disk as hardlinks
+download_cache = DownloadCache()
+
 
 # Pydantic models for request/response validation
 class ContentData(BaseModel):
@@ -39,6 +45,7 @@ class PublishRequest(BaseModel):
     content_extra: str = ""
     video_url: Optional[HttpUrl] = None
     publish_time: Optional[str] = None
+    transcode: bool = False  # re-encode videos exceeding upload limits before publishing
     
     @field_validator('publish_time')
     @classmethod
@@ -61,6 +68,19 @@ class PublishResponse(BaseModel):
     queue_position: Optional[int] = None
 
 
+def discard_video(video_path: str):
+    """Remove a task's video file and release its download cache reference."""
+    # The file is a hardlink into the download cache; the cached copy stays
+    try:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+            print(f"🗑️ Cleaned up {video_path}")
+    except Exception as e:
+        print(f"Warning: Failed to cleanup {video_path}: {e}")
+    finally:
+        download_cache.release(video_path)
+
+
 async def publish_worker():
     """Background worker to process publishing tasks sequentially."""
     while True:
@@ -74,7 +94,8 @@ async def publish_worker():
             success = publish_xhs_content(
                 scripts_data=task.scripts_data,
                 publish_time=task.publish_time,
-                video_path=task.video_path
+                video_path=task.video_path,
+                upload_profile=UploadProfile() if task.transcode else None
             )
             
             if success:
@@ -82,13 +103,7 @@ async def publish_worker():
             else:
                 print(f"❌ Task {task.task_id} failed to publish")
             
-            # Clean up video file
-            try:
-                if os.path.exists(task.video_path):
-                    os.remove(task.video_path)
-                    print(f"🗑️ Cleaned up {task.video_path}")
-            except Exception as e:
-                print(f"Warning: Failed to cleanup {task.video_path}: {e}")
+            discard_video(task.video_path)
             
             # Mark task as done
             publish_queue.task_done()
@@ -115,20 +130,27 @@ async def startup_event():
     print("🚀 Publishing worker started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared download client."""
+    await close_client()
+
+
 @app.post("/publish", response_model=PublishResponse)
 async def publish_content(request: PublishRequest):
     """Publish content to XHS with optional video download."""
     
+    # Generate unique task ID and video path
+    task_id = uuid.uuid4().hex[:8]
+    video_path = f"output/video_{task_id}.mp4"
+    queued = False
     try:
-        # Generate unique task ID and video path
-        task_id = uuid.uuid4().hex[:8]
-        video_path = f"output/video_{task_id}.mp4"
         video_downloaded = False
         
         # Download video if URL provided (concurrent downloads are OK)
         if request.video_url:
             print(f"[{task_id}] Downloading video from: {request.video_url}")
-            success = await download_video(str(request.video_url), video_path)
+            success = await download_cache.fetch(str(request.video_url), video_path)
             if not success:
                 raise HTTPException(
                     status_code=400, 
@@ -166,11 +188,13 @@ async def publish_content(request: PublishRequest):
             scripts_data=scripts_data,
             publish_time=publish_time,
             video_path=video_path,
-            task_id=task_id
+            task_id=task_id,
+            transcode=request.transcode
         )
         
         # Add task to queue for sequential processing
         await publish_queue.put(task)
+        queued = True
         queue_size = publish_queue.qsize()
         
         print(f"[{task_id}] Queued for publishing (queue size: {queue_size})")
@@ -192,6 +216,10 @@ async def publish_content(request: PublishRequest):
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
+    finally:
+        if not queued:
+            # The worker never sees this task: drop the file and its cache reference here
+            discard_video(video_path)
 
 
 @app.get("/health")
@@ -210,7 +238,8 @@ async def queue_status():
     """Get current queue status."""
     return {
         "queue_size": publish_queue.qsize(),
-        "worker_status": "running" if worker_task and not worker_task.done() else "stopped"
+        "worker_status": "running" if worker_task and not worker_task.done() else "stopped",
+        "download_cache": download_cache.stats()
     }
 
 
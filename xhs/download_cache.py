@@ -0,0 +1,231 @@
+"""Content-addressed cache for videos downloaded from ``video_url``.
+
+Clients often resubmit the same URL (retries, the same clip for several
+accounts). Downloads are stored once as ``blobs/<sha256>.mp4`` and each task
+gets a hardlink to the blob, so repeat requests cost no transfer and no copy.
+
+- URL entries remember the ETag / Last-Modified of the response. Within
+  ``max_age`` seconds a cached URL is served as is; after that a HEAD request
+  revalidates it, and the video is downloaded again only when the validators
+  changed.
+- Identical content fetched from different URLs shares one blob.
+- Every hardlink handed out holds a reference until ``release`` is called.
+  Blobs with live references are never evicted, so deleting a task's file
+  after publishing cannot destroy a shared entry.
+- Blobs are evicted least-recently-used first once their total size exceeds
+  ``max_bytes``.
+
+Task files are hardlinks: they must be treated as read-only.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from .utils import download_video, get_client
+
+CACHE_DIR = "output/cache/downloads"
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DownloadCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = 5 * 1024 * 1024 * 1024, max_age: float = 300):
+        """Create the cache.
+
+        Args:
+            root: Cache directory (blobs/, tmp/ and index.json live here).
+            max_bytes: Total size of blobs kept on disk.
+            max_age: Seconds during which a cached URL is served without revalidation.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "index.json")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self.urls: Dict[str, dict] = self._load_index()
+        self.refs: Dict[str, int] = {}
+        self._links: Dict[str, str] = {}
+        self._url_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}  # lock, holders + waiters
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.urls, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, f"{digest}.mp4")
+
+    async def _still_valid(self, url: str, entry: dict) -> bool:
+        """Revalidate with a HEAD request; any failure counts as changed."""
+        if time.time() - entry["checked_at"] < self.max_age:
+            return True
+        try:
+            response = await get_client().head(url)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            return False
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if etag and entry.get("etag"):
+            valid = etag == entry["etag"]
+        elif last_modified and entry.get("last-modified"):
+            valid = last_modified == entry["last-modified"]
+        else:
+            valid = False  # no validators to compare, the content may have changed
+        if valid:
+            entry["checked_at"] = time.time()
+        return valid
+
+    async def _download(self, url: str) -> Optional[str]:
+        """Download into tmp/, move into blobs/ by content hash and record the URL."""
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.mp4")
+        validators: dict = {}
+        if not await download_video(url, tmp_path, validators=validators):
+            return None
+
+        digest = await asyncio.to_thread(_file_sha256, tmp_path)
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)  # same content already cached under another URL
+        else:
+            os.replace(tmp_path, blob_path)
+
+        self.urls[url] = {
+            "sha256": digest,
+            "etag": validators.get("etag"),
+            "last-modified": validators.get("last-modified"),
+            "checked_at": time.time(),
+        }
+        self._save_index()
+        return digest
+
+    def _link(self, digest: str, dest: str):
+        """Hardlink the blob to dest (copy across filesystems) and take a reference."""
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(blob_path, dest)
+        except OSError:
+            shutil.copyfile(blob_path, dest)
+        os.utime(blob_path)  # access time for LRU eviction
+        self._acquire(digest)
+        self._links[os.path.abspath(dest)] = digest
+
+    def _acquire(self, digest: str):
+        self.refs[digest] = self.refs.get(digest, 0) + 1
+
+    def _drop(self, digest: str):
+        self.refs[digest] -= 1
+        if self.refs[digest] <= 0:
+            del self.refs[digest]
+
+    @contextlib.asynccontextmanager
+    async def _url_lock(self, url: str):
+        """Serialize fetches of one URL; the lock is dropped once nobody holds or waits for it."""
+        lock, users = self._url_locks.get(url, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._url_locks[url] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._url_locks[url]
+            if users == 1:
+                del self._url_locks[url]
+            else:
+                self._url_locks[url] = (lock, users - 1)
+
+    async def fetch(self, url: str, dest: str) -> bool:
+        """Place the video at url into dest, downloading only when not cached.
+
+        Returns True on success, like ``download_video``.
+        """
+        async with self._url_lock(url):  # concurrent requests for one URL share a single download
+            digest = None
+            entry = self.urls.get(url)
+            if entry and os.path.exists(self._blob_path(entry["sha256"])):
+                # Hold a reference across the HEAD request so that eviction
+                # triggered by another URL cannot delete the blob meanwhile
+                self._acquire(entry["sha256"])
+                try:
+                    if await self._still_valid(url, entry):
+                        digest = entry["sha256"]
+                finally:
+                    self._drop(entry["sha256"])
+
+            if digest is not None:
+                try:
+                    self._link(digest, dest)
+                    self.hits += 1
+                    print(f"Video cache hit: {url}")
+                except FileNotFoundError:
+                    digest = None  # removed outside the cache, download it again
+            if digest is None:
+                self.misses += 1
+                digest = await self._download(url)
+                if digest is None:
+                    return False
+                self._link(digest, dest)
+        # Only after linking, so the blob just fetched is protected by its reference
+        self.evict()
+        return True
+
+    def release(self, path: str):
+        """Drop the reference held by a task file (call after deleting it)."""
+        digest = self._links.pop(os.path.abspath(path), None)
+        if digest is None:
+            return
+        self._drop(digest)
+
+    def evict(self):
+        """Remove least-recently-used blobs without live references until under max_bytes."""
+        blobs = []
+        for entry in os.scandir(self.blob_dir):
+            stat = entry.stat()
+            blobs.append((stat.st_mtime, stat.st_size, stat.st_nlink, entry.name[:-len(".mp4")]))
+
+        total = sum(size for _, size, _, _ in blobs)
+        for _, size, nlink, digest in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            # nlink > 1: a task file (possibly from before a restart) still links to it
+            if self.refs.get(digest) or nlink > 1:
+                continue
+            os.remove(self._blob_path(digest))
+            total -= size
+            for url in [u for u, e in self.urls.items() if e["sha256"] == digest]:
+                del self.urls[url]
+        self._save_index()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "referenced": len(self.refs)}
@@ -10,7 +10,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import sys
 
-from liulanqi import get_driver
+from .liulanqi import get_driver
+from .transcode import prepare_upload
 
 
 def xiaohongshu_login(driver):
@@ -150,26 +151,32 @@ def publish_xiaohongshu(driver, scripts, publish_time="2025-01-12 16:00", video_
 
     print("视频发布完成！")
 
-def publish_xhs_content(scripts_data, publish_time=None, video_path="output/video.mp4"):
+def publish_xhs_content(scripts_data, publish_time=None, video_path="output/video.mp4", upload_profile=None):
     """Publish content to XHS programmatically.
     
     Args:
         scripts_data (dict): Content data with name, tags, content, etc.
         publish_time (str, optional): Publish time in format "2025-01-12 16:00"
         video_path (str): Path to the video file
+        upload_profile (UploadProfile, optional): When given, videos exceeding its
+            resolution/bitrate/size ceilings are transcoded before uploading
         
     Returns:
         bool: True if successful, False otherwise
     """
     driver = None
+    upload_path = video_path
     try:
+        if upload_profile is not None:
+            upload_path = prepare_upload(video_path, upload_profile)
+
         driver = get_driver()
         xiaohongshu_login(driver=driver)
         print("登录成功")
 
         print("Content data:", scripts_data)
 
-        publish_xiaohongshu(driver, scripts_data, publish_time, video_path)
+        publish_xiaohongshu(driver, scripts_data, publish_time, upload_path)
         return True
 
     except Exception as e:
@@ -180,6 +187,8 @@ def publish_xhs_content(scripts_data, publish_time=None, video_path="output/vide
     finally:
         if driver:
             driver.quit()  # 退出浏览器
+        if upload_path != video_path and os.path.exists(upload_path):
+            os.remove(upload_path)
 
 
 def main():
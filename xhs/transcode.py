@@ -0,0 +1,181 @@
+"""Optional pre-publish transcode for oversized videos.
+
+Videos handed to the upload form can be arbitrary user files (see
+``download_video`` in the API server). Before publishing, ``prepare_upload``
+probes the file and, only when it exceeds the resolution, bitrate or size
+ceilings of an ``UploadProfile``, re-encodes it to a copy that fits. Files
+already within limits are uploaded untouched.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+
+from common.ffmpeg import get_ffmpeg_exe, parse_duration
+
+
+@dataclass
+class UploadProfile:
+    """Upload ceilings and the target encode used when a file exceeds them."""
+    max_long_side: int = 1920
+    max_short_side: int = 1080
+    max_bitrate: int = 8_000_000          # overall bits per second
+    max_size: int = 200 * 1024 * 1024     # bytes
+    video_bitrate: int = 4_000_000        # cap for the re-encoded video stream
+    audio_bitrate: int = 128_000
+    crf: int = 23
+    preset: str = "veryfast"
+
+
+@dataclass
+class MediaInfo:
+    width: int
+    height: int
+    duration: float
+    bitrate: int
+    size: int
+    audio_codec: Optional[str] = None
+
+
+def _probe_with_ffprobe(ffprobe: str, path: str) -> MediaInfo:
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, text=True, check=True
+    )
+    data = json.loads(result.stdout)
+    video = next(s for s in data["streams"] if s.get("codec_type") == "video")
+    audio = next((s for s in data["streams"] if s.get("codec_type") == "audio"), None)
+    fmt = data.get("format", {})
+    size = int(fmt.get("size") or os.path.getsize(path))
+    duration = float(fmt.get("duration") or 0)
+    bitrate = int(fmt.get("bit_rate") or (size * 8 / duration if duration else 0))
+    return MediaInfo(
+        width=int(video["width"]),
+        height=int(video["height"]),
+        duration=duration,
+        bitrate=bitrate,
+        size=size,
+        audio_codec=audio.get("codec_name") if audio else None,
+    )
+
+
+def _probe_with_ffmpeg(path: str) -> MediaInfo:
+    """Fallback when ffprobe is unavailable: parse the banner of ``ffmpeg -i``."""
+    stderr = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-i", path], capture_output=True, text=True
+    ).stderr
+    size = os.path.getsize(path)
+    duration = parse_duration(stderr) or 0.0
+
+    video = re.search(r"Stream #.*Video: .*?, (\d{2,5})x(\d{2,5})", stderr)
+    if not video:
+        raise ValueError(f"No video stream found in {path}")
+    audio = re.search(r"Stream #.*Audio: (\w+)", stderr)
+    bitrate = re.search(r"bitrate: (\d+) kb/s", stderr)
+
+    return MediaInfo(
+        width=int(video.group(1)),
+        height=int(video.group(2)),
+        duration=duration,
+        bitrate=int(bitrate.group(1)) * 1000 if bitrate else int(size * 8 / duration if duration else 0),
+        size=size,
+        audio_codec=audio.group(1) if audio else None,
+    )
+
+
+def probe_video(path: str) -> MediaInfo:
+    """Read dimensions, duration, bitrate and size, preferring ffprobe."""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        return _probe_with_ffprobe(ffprobe, path)
+    return _probe_with_ffmpeg(path)
+
+
+def exceeded_limits(info: MediaInfo, profile: UploadProfile) -> List[str]:
+    """Return a description of every ceiling the file exceeds (empty if none)."""
+    reasons = []
+    long_side, short_side = max(info.width, info.height), min(info.width, info.height)
+    if long_side > profile.max_long_side or short_side > profile.max_short_side:
+        reasons.append(f"resolution {info.width}x{info.height}")
+    if info.bitrate > profile.max_bitrate:
+        reasons.append(f"bitrate {info.bitrate // 1000} kb/s")
+    if info.size > profile.max_size:
+        reasons.append(f"size {info.size / 1024 / 1024:.1f} MB")
+    return reasons
+
+
+def transcode_video(input_path: str, output_path: str, info: MediaInfo, profile: UploadProfile) -> str:
+    """Re-encode to H.264/AAC within the profile's resolution, bitrate and size ceilings."""
+    # Fit inside the long/short side box in either orientation, keep dimensions even for yuv420p
+    if info.width >= info.height:
+        box_w, box_h = profile.max_long_side, profile.max_short_side
+    else:
+        box_w, box_h = profile.max_short_side, profile.max_long_side
+    scale = (
+        f"scale='min({box_w},iw)':'min({box_h},ih)':force_original_aspect_ratio=decrease,"
+        "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p"
+    )
+
+    # Cap the video bitrate so that the whole file also fits the size ceiling (5% muxing headroom)
+    video_bitrate = profile.video_bitrate
+    if info.duration:
+        budget = int(profile.max_size * 8 * 0.95 / info.duration) - profile.audio_bitrate
+        video_bitrate = max(200_000, min(video_bitrate, budget))
+
+    audio_args = ["-c:a", "aac", "-b:a", str(profile.audio_bitrate)]
+    if info.audio_codec is None:
+        audio_args = ["-an"]
+
+    tmp_path = f"{output_path}.part"
+    cmd = [
+        get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-i", input_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", scale,
+        "-c:v", "libx264", "-preset", profile.preset, "-crf", str(profile.crf),
+        "-maxrate", str(video_bitrate), "-bufsize", str(video_bitrate * 2),
+    ] + audio_args + [
+        "-movflags", "+faststart",
+        "-f", "mp4", tmp_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"Transcode failed: {result.stderr.strip()}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def prepare_upload(video_path: str, profile: Optional[UploadProfile] = None) -> str:
+    """Return the path to upload: the original file, or a transcoded copy next to it.
+
+    The copy is written as ``<name>.upload.mp4``; callers should delete it after
+    publishing when the returned path differs from ``video_path``. The
+    transcode is best effort: if probing or encoding fails, the original file
+    is uploaded and the platform re-encodes it as usual.
+    """
+    profile = profile or UploadProfile()
+    try:
+        info = probe_video(video_path)
+    except Exception as e:
+        print(f"Warning: could not probe {video_path} ({e}), uploading as is")
+        return video_path
+    reasons = exceeded_limits(info, profile)
+    if not reasons:
+        print(f"Video within upload limits, uploading as is: {video_path}")
+        return video_path
+
+    output_path = os.path.splitext(video_path)[0] + ".upload.mp4"
+    print(f"Transcoding {video_path} for upload ({', '.join(reasons)})")
+    try:
+        transcode_video(video_path, output_path, info, profile)
+    except Exception as e:
+        print(f"Warning: transcode failed ({e}), uploading the original file")
+        return video_path
+    print(f"Transcoded: {info.size / 1024 / 1024:.1f} MB -> "
+          f"{os.path.getsize(output_path) / 1024 / 1024:.1f} MB")
+    return output_path
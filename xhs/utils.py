@@ -1,26 +1,132 @@
+import asyncio
 import os
 import httpx
-from typing import List, Union
+from typing import List, Optional, Union
 import re
 
 
-async def download_video(video_url: str, output_path: str = "output/video.mp4") -> bool:
-    """Download video from URL to specified path."""
-    try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(video_url, follow_redirects=True)
+# Download limits for user-supplied video URLs
+MAX_VIDEO_BYTES = 500 * 1024 * 1024
+ALLOWED_CONTENT_TYPES = (
+    "video/",
+    "application/mp4",
+    "application/octet-stream",
+    "binary/octet-stream",
+)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class DownloadError(Exception):
+    """Permanent download failure (bad status, content type or size); not retried."""
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled client so concurrent downloads reuse connections."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, read=60.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client; call on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _check_response(response: httpx.Response, offset: int, max_bytes: int):
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and not content_type.startswith(ALLOWED_CONTENT_TYPES):
+        raise DownloadError(f"Unexpected content type: {content_type}")
+
+    length = response.headers.get("content-length")
+    if length is not None and offset + int(length) > max_bytes:
+        raise DownloadError(f"Video too large: {offset + int(length)} bytes (limit {max_bytes})")
+
+
+async def _fetch(url: str, tmp_path: str, max_bytes: int, validators: dict):
+    """Stream the body into tmp_path, resuming from its current size when possible.
+
+    validators holds the ETag / Last-Modified of the first response; resumed
+    requests send it as If-Range so a changed file is fetched from scratch.
+    """
+    offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+    headers = {}
+    if offset and validators:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validators.get("etag") or validators["last-modified"]
+
+    async with get_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 206 and offset:
+            content_range = response.headers.get("content-range", "")
+            if not content_range.startswith(f"bytes {offset}-"):
+                raise DownloadError(f"Unexpected Content-Range: {content_range}")
+            mode = "ab"
+        else:
             response.raise_for_status()
-            
-            with open(output_path, "wb") as f:
-                f.write(response.content)
-                
-        print(f"Video downloaded: {output_path}")
+            offset, mode = 0, "wb"
+            validators.clear()
+            validators.update({
+                key: response.headers[key]
+                for key in ("etag", "last-modified") if key in response.headers
+            })
+        _check_response(response, offset, max_bytes)
+
+        written = offset
+        with open(tmp_path, mode) as f:
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise DownloadError(f"Video exceeds size limit of {max_bytes} bytes")
+                f.write(chunk)
+    return written
+
+
+async def download_video(
+    video_url: str,
+    output_path: str = "output/video.mp4",
+    max_bytes: int = MAX_VIDEO_BYTES,
+    max_retries: int = 3,
+    validators: Optional[dict] = None,
+) -> bool:
+    """Download video from URL to specified path.
+
+    The body is streamed in chunks to ``<output_path>.part`` and renamed into
+    place once complete, so memory use stays flat regardless of video size.
+    Interrupted transfers are resumed with an HTTP Range request when the
+    server supports it. If ``validators`` is given it receives the ETag /
+    Last-Modified headers of the downloaded response.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = f"{output_path}.part"
+    validators = {} if validators is None else validators
+    try:
+        for attempt in range(max_retries + 1):
+            try:
+                size = await _fetch(video_url, tmp_path, max_bytes, validators)
+                break
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    raise
+                print(f"Download interrupted ({e!r}), resuming (attempt {attempt + 2})")
+                await asyncio.sleep(2 ** attempt)
+
+        os.replace(tmp_path, output_path)
+        print(f"Video downloaded: {output_path} ({size} bytes)")
         return True
-        
+
     except Exception as e:
         print(f"Download failed: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
 